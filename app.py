@@ -3,12 +3,23 @@
 import os
 import re
 import time
+import threading
 from datetime import datetime, timedelta
+import openpyxl
 import pandas as pd
 import streamlit as st
+from streamlit.errors import StreamlitAPIException
 import requests
 import hashlib
 import json
+import sqlite3
+from collections import OrderedDict, deque
+from contextlib import closing, contextmanager
+from pandas.io.parsers import TextParser
+
+# 缓存的数据在各会话间共享，开启写时复制，派生数据的修改不会影响共享数据（pandas 3 起默认开启）
+if int(pd.__version__.split(".")[0]) < 3:
+    pd.set_option("mode.copy_on_write", True)
 
 
 # ==================== 系统配置 ====================
@@ -21,6 +32,13 @@ class AppConfig:
     ]
 
     LOGISTICS_SHEET_NAME = "物流明细"
+    # 以只读流式方式读取 Excel，只保留清洗需要的列；设为 False 时整表读取（pd.read_excel）
+    EXCEL_PROJECTED_READ = True
+    # 发货计划表除 BACKUP_COL_MAPPING 中的列外还需读取的列，以及按位置读取的列（第16列超期天数、第18列项目部）
+    PLAN_EXTRA_COLUMNS = ["规格型号", "已发量", "计划进场时间"]
+    PLAN_POSITION_COLUMNS = [15, 17]
+    # 物流明细表按位置读取的列（G列卸货地址）
+    LOGISTICS_POSITION_COLUMNS = [6]
     # 【修改点】：调整列顺序，将"卸货地址"移动到"联系人"左边
     LOGISTICS_COLUMNS = [
         "钢厂", "物资名称", "规格型号", "单位", "数量",
@@ -35,13 +53,67 @@ class AppConfig:
         '需求量': ['需求吨位', '计划量', '数量'],
         '下单时间': ['创建时间', '日期', '录入时间']
     }
-    WEBHOOK_URL = "https://open.feishu.cn/open-apis/bot/v2/hook/dcf16af3-78d2-433f-9c3d-b4cd108c7b60"
+    # 可通过环境变量 FEISHU_WEBHOOK_URL 指向本地调试服务（见 feishu_stub.py）
+    WEBHOOK_URL = os.environ.get(
+        "FEISHU_WEBHOOK_URL",
+        "https://open.feishu.cn/open-apis/bot/v2/hook/dcf16af3-78d2-433f-9c3d-b4cd108c7b60"
+    )
+    # 飞书通知发件箱（后台线程发送，进程重启后继续投递）
+    WEBHOOK_OUTBOX_DB = "feishu_outbox.db"
+    WEBHOOK_TIMEOUT_SECONDS = 5
+    WEBHOOK_MAX_ATTEMPTS = 5
+    # 重试间隔按 2^n 递增：2, 4, 8 ... 秒，最长 300 秒
+    WEBHOOK_RETRY_BASE_SECONDS = 2
+    WEBHOOK_RETRY_MAX_SECONDS = 300
+    # 未到货通知汇总窗口（秒）：窗口内同一项目部的通知合并为一张卡片；为 0 时逐条发送
+    WEBHOOK_DIGEST_WINDOW_SECONDS = 60
+    # 单张汇总卡片最多列出的物资条数，超出时拆分为多张卡片
+    WEBHOOK_DIGEST_MAX_ITEMS = 40
     LOGISTICS_DATE_RANGE_DAYS = 5
-
+    # 物流明细表按页渲染：每页行数可选项，搜索框匹配的列，可排序的列
+    LOGISTICS_PAGE_SIZE_OPTIONS = [50, 100, 200, 500]
+    LOGISTICS_SEARCH_COLUMNS = ["物资名称", "规格型号", "钢厂", "项目部", "卸货地址", "联系人", "备注"]
+    LOGISTICS_SORT_COLUMNS = ["交货时间", "钢厂", "物资名称", "规格型号", "数量", "项目部", "到货状态"]
+    # 批量更新选择框最多列出的记录数，超出时需先搜索缩小范围
+    BATCH_PICKER_MAX_OPTIONS = 200
+    # 每个会话记住最近保存过的到货状态（按 record_id），避免编辑器的同一处修改在后续重跑中被重复保存
+    STATUS_EDIT_DEDUPE_SIZE = 1000
+    # 首页和链接可选的项目部：交货时间在今天前后若干天内有记录
+    ACTIVE_PROJECT_WINDOW_DAYS = 15
+
+    # 解析后数据的列式快照目录（Parquet），工作簿内容变化时自动重建
+    SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), ".data_cache")
+    # 清洗逻辑或列类型变化时递增，使旧快照失效
+    SNAPSHOT_SCHEMA_VERSION = 4
+    # 后台监测数据文件变化的轮询间隔（秒）
+    WATCHER_INTERVAL_SECONDS = 10
+
+    # 各处理阶段耗时统计：每个阶段保留最近若干次耗时用于计算分位数，并定期导出到本地文件
+    METRICS_WINDOW_SIZE = 500
+    METRICS_FILE = "stage_metrics.json"
+    METRICS_EXPORT_INTERVAL_SECONDS = 60
+
+    # 旧版CSV状态文件，首次启用数据库时自动导入
     LOGISTICS_STATUS_FILE = "logistics_status.csv"
+    LOGISTICS_STATUS_DB = "logistics_status.db"
+    # 多个会话/进程同时写状态库：等待写锁的最长秒数；WAL 模式下读不阻塞写
+    STATUS_DB_BUSY_TIMEOUT_SECONDS = 30
+    STATUS_DB_WAL = True
     # 扩展状态选项
     STATUS_OPTIONS = ["公司统筹中", "钢厂已接单", "运输装货中", "已到货", "未到货"]
+    # 未手动设置到货状态的记录按以下规则给出默认状态：
+    # 每行取第一条适用范围匹配的规则（可按"项目部"或"钢厂"限定，值为名称或名称列表），
+    # 交货时间早于 今天 - lead_days 时取规则的 status，否则为 DEFAULT_STATUS；专用规则应写在通用规则之前
+    DEFAULT_STATUS = "钢厂已接单"
+    DEFAULT_STATUS_RULES = [
+        # {"钢厂": ["达钢", "威钢"], "lead_days": 5, "status": "已到货"},
+        {"lead_days": 3, "status": "已到货"},
+    ]
+    DEFAULT_STATUS_RULE_SCOPES = ["项目部", "钢厂"]
     PROJECT_COLUMN = "项目部名称"
+    # 取值重复较多的文本列，加载后转为分类类型以缩小缓存数据、加快分组统计
+    PLAN_CATEGORY_COLUMNS = ["标段名称", "物资名称", "规格型号", PROJECT_COLUMN]
+    LOGISTICS_CATEGORY_COLUMNS = ["钢厂", "物资名称", "规格型号", "单位", "项目部"]
 
     # 项目名称映射（拼音标识）
     PROJECT_MAPPING = {
@@ -105,9 +177,102 @@ class AppConfig:
     }
 
 
+# ==================== 性能监测 ====================
+class StageMetrics:
+    """各处理阶段耗时的滚动统计
+
+    每个阶段保留最近 window_size 次耗时，用于计算 p50/p95；请求线程和后台线程共用，
+    距上次导出超过 export_interval 秒时把汇总结果写入 export_path。
+    """
+
+    def __init__(self, window_size, export_path, export_interval):
+        self.window_size = window_size
+        self.export_path = export_path
+        self.export_interval = export_interval
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = {}
+        self._last_export = time.time()
+        self.last_export_time = None
+
+    def record(self, stage, seconds):
+        now = time.time()
+        with self._lock:
+            samples = self._samples.get(stage)
+            if samples is None:
+                samples = self._samples[stage] = deque(maxlen=self.window_size)
+            samples.append(seconds)
+            self._counts[stage] = self._counts.get(stage, 0) + 1
+            export_due = now - self._last_export >= self.export_interval
+            if export_due:
+                self._last_export = now
+        if export_due:
+            self.export()
+
+    def summary(self):
+        """返回各阶段的次数和耗时分位数（毫秒），按 p95 从高到低排列"""
+        with self._lock:
+            stages = {stage: list(samples) for stage, samples in self._samples.items()}
+            counts = dict(self._counts)
+        rows = []
+        for stage, samples in stages.items():
+            samples_ms = pd.Series(samples) * 1000
+            rows.append({
+                "阶段": stage,
+                "总次数": counts[stage],
+                "样本数": len(samples_ms),
+                "p50(ms)": samples_ms.quantile(0.5),
+                "p95(ms)": samples_ms.quantile(0.95),
+                "最大(ms)": samples_ms.max(),
+                "最近(ms)": samples_ms.iloc[-1],
+            })
+        columns = ["阶段", "总次数", "样本数", "p50(ms)", "p95(ms)", "最大(ms)", "最近(ms)"]
+        return pd.DataFrame(rows, columns=columns).sort_values("p95(ms)", ascending=False, ignore_index=True)
+
+    def export(self):
+        """把汇总结果原子写入 export_path，写入失败时静默忽略"""
+        summary = self.summary().round(3)
+        payload = {
+            "exported_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "pid": os.getpid(),
+            "window_size": self.window_size,
+            "stages": summary.to_dict(orient="records"),
+        }
+        tmp_path = f"{self.export_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.export_path)
+            self.last_export_time = payload["exported_at"]
+            return True
+        except OSError:
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+@st.cache_resource
+def get_stage_metrics():
+    return StageMetrics(AppConfig.METRICS_WINDOW_SIZE, AppConfig.METRICS_FILE,
+                        AppConfig.METRICS_EXPORT_INTERVAL_SECONDS)
+
+
+@contextmanager
+def timed(stage):
+    """把代码块的耗时记入 stage，可用作 with 语句或函数装饰器"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_stage_metrics().record(stage, time.perf_counter() - start)
+
+
 # ==================== 辅助函数 ====================
-def find_data_file():
-    """查找数据文件，静默版本"""
+def locate_data_file():
+    """查找数据文件，找不到时返回 None（不输出界面提示，可在后台线程调用）"""
     for path in AppConfig.DATA_PATHS:
         if os.path.exists(path):
             return path
@@ -119,10 +284,18 @@ def find_data_file():
             first_excel = os.path.join(current_dir, excel_files[0])
             return first_excel
 
-    st.error("❌ 未找到任何Excel数据文件")
     return None
 
 
+@timed("查找数据文件")
+def find_data_file():
+    """查找数据文件，静默版本"""
+    path = locate_data_file()
+    if path is None:
+        st.error("❌ 未找到任何Excel数据文件")
+    return path
+
+
 def apply_card_styles():
     st.markdown(f"""
     <style>
@@ -331,30 +504,220 @@ def apply_card_styles():
     """, unsafe_allow_html=True)
 
 
-def generate_record_id(row):
-    key_fields = [
-        str(row["钢厂"]),
-        str(row["物资名称"]),
-        str(row["规格型号"]),
-        str(row["交货时间"]),
-        str(row["项目部"])
-    ]
-    return hashlib.md5("|".join(key_fields).encode('utf-8')).hexdigest()
+RECORD_ID_FIELDS = ["钢厂", "物资名称", "规格型号", "交货时间", "项目部"]
+
+
+def record_id_key_strings(series):
+    """按列将值转为与 str(value) 完全一致的字符串，保证记录ID与历史状态文件兼容"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        keys = series.dt.strftime("%Y-%m-%d %H:%M:%S").astype(object)
+        # 带微秒的时间以及 NaT 与 str(Timestamp) 的格式不同，单独处理
+        irregular = series.isna() | (series.dt.microsecond != 0) | (series.dt.nanosecond != 0)
+        if irregular.any():
+            keys[irregular] = series[irregular].astype(object).map(str)
+        return keys
+    return series.astype(object).map(str)
+
+
+def generate_record_ids(df):
+    """按列批量生成记录ID：拼接五个关键字段后做 MD5，结果与逐行生成的ID相同"""
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    keys = record_id_key_strings(df[RECORD_ID_FIELDS[0]])
+    for col in RECORD_ID_FIELDS[1:]:
+        keys = keys + "|" + record_id_key_strings(df[col])
+    return pd.Series(
+        [hashlib.md5(key.encode('utf-8')).hexdigest() for key in keys],
+        index=df.index,
+        dtype=object
+    )
 
 
-def send_feishu_notification(material_info):
-    message = {
+class FeishuDispatcher:
+    """飞书通知后台发送器
+
+    通知先写入 SQLite 发件箱即返回，由后台线程带超时发送；失败按指数退避重试，
+    超过最大次数后标记为失败并保留在发件箱中以便排查。
+    """
+
+    def __init__(self, db_path, webhook_url):
+        self.db_path = db_path
+        self.webhook_url = webhook_url
+        self._wake = threading.Event()
+        self._worker = None
+        with self._connect() as conn, conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feishu_outbox ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, payload TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, next_attempt REAL NOT NULL, "
+                "failed INTEGER NOT NULL DEFAULT 0, last_error TEXT, created REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON feishu_outbox (failed, next_attempt)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feishu_digest ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, project TEXT NOT NULL, "
+                "item TEXT NOT NULL, created REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return closing(sqlite3.connect(self.db_path, timeout=10))
+
+    def enqueue(self, message):
+        """将消息写入发件箱并唤醒后台线程，立即返回"""
+        now = time.time()
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT INTO feishu_outbox (payload, next_attempt, created) VALUES (?, ?, ?)",
+                (json.dumps(message, ensure_ascii=False), now, now)
+            )
+        self._wake.set()
+
+    def add_digest_item(self, project, material_info):
+        """暂存一条未到货物资，等待汇总窗口结束后与同项目部的其他物资合并发送"""
+        with self._connect() as conn, conn:
+            conn.execute(
+                "INSERT INTO feishu_digest (project, item, created) VALUES (?, ?, ?)",
+                (project, json.dumps(material_info, ensure_ascii=False, default=str), time.time())
+            )
+        self._wake.set()
+
+    def flush_digests(self, force=False):
+        """将汇总窗口已结束的项目部物资合并成卡片放入发件箱，返回距下一次汇总的秒数"""
+        window = AppConfig.WEBHOOK_DIGEST_WINDOW_SECONDS
+        with self._connect() as conn:
+            # 立即加写锁，多进程共用发件箱时同一批物资只会被汇总一次
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                projects = conn.execute(
+                    "SELECT project FROM feishu_digest GROUP BY project HAVING MIN(created) <= ?",
+                    (now if force else now - window,)
+                ).fetchall()
+                for (project,) in projects:
+                    rows = conn.execute(
+                        "SELECT id, item FROM feishu_digest WHERE project = ? ORDER BY id", (project,)
+                    ).fetchall()
+                    items = [json.loads(item) for _, item in rows]
+                    for message in build_digest_messages(project, items):
+                        conn.execute(
+                            "INSERT INTO feishu_outbox (payload, next_attempt, created) VALUES (?, ?, ?)",
+                            (json.dumps(message, ensure_ascii=False), now, now)
+                        )
+                    conn.execute(
+                        f"DELETE FROM feishu_digest WHERE id IN ({','.join('?' * len(rows))})",
+                        [item_id for item_id, _ in rows]
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            oldest = conn.execute("SELECT MIN(created) FROM feishu_digest").fetchone()[0]
+        if oldest is None:
+            return AppConfig.WEBHOOK_RETRY_MAX_SECONDS
+        return max(0.0, oldest + window - time.time())
+
+    def pending_count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM feishu_outbox WHERE failed = 0").fetchone()[0]
+
+    def start(self):
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="feishu-dispatcher", daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            try:
+                digest_delay = self.flush_digests()
+                delay = min(digest_delay, self.dispatch_due())
+            except Exception:
+                delay = AppConfig.WEBHOOK_RETRY_BASE_SECONDS
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def _claim(self, conn, item_id, next_attempt, now):
+        """占用一条到期消息（多进程共用发件箱时避免重复发送）"""
+        lease_until = now + AppConfig.WEBHOOK_TIMEOUT_SECONDS * 2
+        with conn:
+            cursor = conn.execute(
+                "UPDATE feishu_outbox SET next_attempt = ? WHERE id = ? AND next_attempt = ? AND failed = 0",
+                (lease_until, item_id, next_attempt)
+            )
+        return cursor.rowcount == 1
+
+    def dispatch_due(self):
+        """发送所有到期消息，返回距下一条到期消息的秒数"""
+        with self._connect() as conn:
+            now = time.time()
+            due = conn.execute(
+                "SELECT id, payload, attempts, next_attempt FROM feishu_outbox "
+                "WHERE failed = 0 AND next_attempt <= ? ORDER BY id LIMIT 100",
+                (now,)
+            ).fetchall()
+
+            for item_id, payload, attempts, next_attempt in due:
+                if not self._claim(conn, item_id, next_attempt, now):
+                    continue
+                with timed("飞书发送"):
+                    error = self._post(payload)
+                with conn:
+                    if error is None:
+                        conn.execute("DELETE FROM feishu_outbox WHERE id = ?", (item_id,))
+                    else:
+                        attempts += 1
+                        backoff = min(AppConfig.WEBHOOK_RETRY_BASE_SECONDS * (2 ** (attempts - 1)),
+                                      AppConfig.WEBHOOK_RETRY_MAX_SECONDS)
+                        conn.execute(
+                            "UPDATE feishu_outbox SET attempts = ?, next_attempt = ?, failed = ?, last_error = ? "
+                            "WHERE id = ?",
+                            (attempts, time.time() + backoff,
+                             int(attempts >= AppConfig.WEBHOOK_MAX_ATTEMPTS), error, item_id)
+                        )
+
+            row = conn.execute("SELECT MIN(next_attempt) FROM feishu_outbox WHERE failed = 0").fetchone()
+        if row[0] is None:
+            return AppConfig.WEBHOOK_RETRY_MAX_SECONDS
+        return max(0.0, row[0] - time.time())
+
+    def _post(self, payload):
+        """发送一条消息，成功返回 None，失败返回错误描述"""
+        try:
+            response = requests.post(
+                self.webhook_url,
+                data=payload.encode('utf-8'),
+                headers={'Content-Type': 'application/json'},
+                timeout=AppConfig.WEBHOOK_TIMEOUT_SECONDS
+            )
+            if response.status_code != 200:
+                return f"HTTP {response.status_code}"
+            try:
+                result = response.json()
+            except ValueError:
+                return None
+            # 飞书限流等业务错误同样返回 HTTP 200，需检查 code
+            if isinstance(result, dict) and result.get("code", 0) != 0:
+                return f"code {result.get('code')}: {result.get('msg', '')}"
+            return None
+        except requests.RequestException as e:
+            return str(e)
+
+
+@st.cache_resource
+def get_feishu_dispatcher():
+    dispatcher = FeishuDispatcher(AppConfig.WEBHOOK_OUTBOX_DB, AppConfig.WEBHOOK_URL)
+    dispatcher.start()
+    return dispatcher
+
+
+def build_notification_card(title, content, note):
+    return {
         "msg_type": "interactive",
         "card": {
             "config": {"wide_screen_mode": True},
             "elements": [{
                 "tag": "div",
                 "text": {
-                    "content": f"**物资名称**: {material_info['物资名称']}\n"
-                               f"**规格型号**: {material_info['规格型号']}\n"
-                               f"**数量**: {material_info['数量']}\n"
-                               f"**交货时间**: {material_info['交货时间']}\n"
-                               f"**项目部**: {material_info['项目部']}",
+                    "content": content,
                     "tag": "lark_md"
                 }
             }, {
@@ -362,356 +725,1051 @@ def send_feishu_notification(material_info):
             }, {
                 "tag": "note",
                 "elements": [{
-                    "content": "⚠️ 该物资状态已更新为【未到货】，请及时跟进",
+                    "content": note,
                     "tag": "plain_text"
                 }]
             }],
             "header": {
                 "template": "red",
                 "title": {
-                    "content": "【物流状态更新通知】",
+                    "content": title,
                     "tag": "plain_text"
                 }
             }
         }
     }
+
+
+def build_single_message(material_info):
+    return build_notification_card(
+        "【物流状态更新通知】",
+        f"**物资名称**: {material_info['物资名称']}\n"
+        f"**规格型号**: {material_info['规格型号']}\n"
+        f"**数量**: {material_info['数量']}\n"
+        f"**交货时间**: {material_info['交货时间']}\n"
+        f"**项目部**: {material_info['项目部']}",
+        "⚠️ 该物资状态已更新为【未到货】，请及时跟进"
+    )
+
+
+def build_digest_messages(project, items):
+    """同一项目部的多条未到货物资合并为卡片，只有一条时沿用单条通知格式"""
+    if len(items) == 1:
+        return [build_single_message(items[0])]
+
+    max_items = AppConfig.WEBHOOK_DIGEST_MAX_ITEMS
+    chunks = [items[i:i + max_items] for i in range(0, len(items), max_items)]
+    messages = []
+    for page, chunk in enumerate(chunks, start=1):
+        lines = [f"**项目部**: {project}"]
+        for item in chunk:
+            lines.append(
+                f"- **{item['物资名称']}** {item['规格型号']}｜数量: {item['数量']}｜交货时间: {item['交货时间']}"
+            )
+        title = f"【物流状态更新通知】{len(items)} 项物资未到货"
+        if len(chunks) > 1:
+            title += f"（{page}/{len(chunks)}）"
+        messages.append(build_notification_card(
+            title,
+            "\n".join(lines),
+            f"⚠️ 以上 {len(chunk)} 项物资状态已更新为【未到货】，请及时跟进"
+        ))
+    return messages
+
+
+def send_feishu_notification(material_info):
+    """发送未到货通知：开启汇总时按项目部合并，否则单条放入发件箱，均由后台线程发送"""
     try:
-        response = requests.post(
-            AppConfig.WEBHOOK_URL,
-            data=json.dumps(message),
-            headers={'Content-Type': 'application/json'}
-        )
-        return response.status_code == 200
+        dispatcher = get_feishu_dispatcher()
+        if AppConfig.WEBHOOK_DIGEST_WINDOW_SECONDS > 0:
+            dispatcher.add_digest_item(str(material_info['项目部']), material_info)
+        else:
+            dispatcher.enqueue(build_single_message(material_info))
+        return True
     except Exception as e:
         st.error(f"飞书通知发送失败: {str(e)}")
         return False
 
 
 # ==================== 数据加载 ====================
-@st.cache_data(ttl=3600)
-def load_data():
+def empty_logistics_df():
+    return pd.DataFrame(columns=AppConfig.LOGISTICS_COLUMNS + ["record_id"])
+
+
+def column_position_name(position):
+    return f"__col_{position}"
+
+
+def column_at(df, position):
+    """取工作表第 position 列（从0开始）；流式读取时该列以 column_position_name(position) 命名"""
+    name = column_position_name(position)
+    if name in df.columns:
+        return df[name]
+    return df.iloc[:, position]
+
+
+def clean_plan_data(df):
+    """清洗发货计划表（列名映射、数值转换、超期天数）
+
+    清洗可能在后台线程进行，失败时抛出 ValueError，由调用方保留旧数据并提示错误。
+    """
     def safe_convert_to_numeric(series, default=0):
         str_series = series.astype(str)
         cleaned = str_series.str.replace(r'[^\d.-]', '', regex=True)
         cleaned = cleaned.replace({'': '0', 'nan': '0', 'None': '0'})
         return pd.to_numeric(cleaned, errors='coerce').fillna(default)
 
-    data_path = find_data_file()
-    if not data_path:
-        st.error("❌ 未找到发货计划数据文件")
-        return pd.DataFrame()
+    try:
+        for std_col, alt_cols in AppConfig.BACKUP_COL_MAPPING.items():
+            for alt_col in alt_cols:
+                if alt_col in df.columns and std_col not in df.columns:
+                    df.rename(columns={alt_col: std_col}, inplace=True)
+                    break
+
+        REQUIRED_COLS = ['标段名称', '物资名称', '下单时间', '需求量']
+        missing_cols = [col for col in REQUIRED_COLS if col not in df.columns]
+        if missing_cols:
+            raise ValueError(f"缺少必要列: {missing_cols}")
+
+        df["物资名称"] = df["物资名称"].astype(str).str.strip().replace({
+            "": "未指定物资", "nan": "未指定物资", "None": "未指定物资", None: "未指定物资"})
+
+        df[AppConfig.PROJECT_COLUMN] = column_at(df, 17).astype(str).str.strip().replace({
+            "": "未指定项目部", "nan": "未指定项目部", "None": "未指定项目部", None: "未指定项目部"})
+
+        df["下单时间"] = pd.to_datetime(df["下单时间"], errors='coerce').dt.tz_localize(None)
+        df = df[~df["下单时间"].isna()]
+        # 按下单时间排序，日期范围查询使用二分查找（见 slice_date_range）
+        df = df.sort_values("下单时间", kind="stable")
+
+        df["需求量"] = safe_convert_to_numeric(df["需求量"]).astype(int)
+        df["已发量"] = safe_convert_to_numeric(df.get("已发量", 0)).astype(int)
+        df["剩余量"] = (df["需求量"] - df["已发量"]).clip(lower=0).astype(int)
+
+        if "计划进场时间" in df.columns:
+            df["计划进场时间"] = pd.to_datetime(df["计划进场时间"], errors='coerce').dt.tz_localize(None)
+
+        try:
+            # 获取第16列数据 (索引从0开始，所以是15)
+            df["超期天数"] = safe_convert_to_numeric(column_at(df, 15)).astype(int)
+        except Exception:
+            df["超期天数"] = 0
+
+        return df.drop(columns=[column_position_name(p) for p in AppConfig.PLAN_POSITION_COLUMNS],
+                       errors="ignore")
+    except Exception as e:
+        raise ValueError(f"发货计划数据清洗失败: {str(e)}") from e
+
+
+def clean_logistics_data(df):
+    """清洗物流明细表并生成记录ID，失败时抛出 ValueError（同 clean_plan_data）"""
+    if df is None:
+        return empty_logistics_df()
 
     try:
-        with st.spinner("正在加载基础数据..."):
-            df = pd.read_excel(data_path, engine='openpyxl')
+        # 【新增逻辑】强制从 G列 (索引6) 读取数据作为 "卸货地址"
+        # 无论Excel表头是什么，G列被视为卸货地址
+        try:
+            df["卸货地址"] = column_at(df, 6).astype(str).replace({"nan": "", "None": ""})
+        except IndexError:
+            df["卸货地址"] = ""
+
+        if df.empty:
+            return empty_logistics_df()
+
+        # 确保所有必要的列都存在
+        for col in AppConfig.LOGISTICS_COLUMNS:
+            if col not in df.columns:
+                df[col] = "" if col != "数量" else 0
+
+        # 数据清洗和格式化
+        df["物资名称"] = df["物资名称"].astype(str).str.strip().replace({
+            "": "未指定物资", "nan": "未指定物资", "None": "未指定物资", None: "未指定物资"})
+        df["钢厂"] = df["钢厂"].astype(str).str.strip().replace({
+            "": "未指定钢厂", "nan": "未指定钢厂", "None": "未指定钢厂", None: "未指定钢厂"})
+        df["项目部"] = df["项目部"].astype(str).str.strip().replace({
+            "未指定项目部": "", "nan": "", "None": "", None: ""})
+
+        # 过滤掉项目部为空的数据
+        df = df[df["项目部"] != ""]
+
+        # 安全转换数值列
+        def safe_convert_numeric(series):
+            if series.dtype == 'object':
+                # 处理字符串中的通配符和非数字字符
+                cleaned = series.astype(str).str.replace(r'[^\d.-]', '', regex=True)
+                cleaned = cleaned.replace({'': '0', 'nan': '0', 'None': '0', ' ': '0'})
+                return pd.to_numeric(cleaned, errors='coerce').fillna(0)
+            else:
+                return pd.to_numeric(series, errors='coerce').fillna(0)
 
-            for std_col, alt_cols in AppConfig.BACKUP_COL_MAPPING.items():
-                for alt_col in alt_cols:
-                    if alt_col in df.columns and std_col not in df.columns:
-                        df.rename(columns={alt_col: std_col}, inplace=True)
-                        break
+        df["数量"] = safe_convert_numeric(df["数量"])
 
-            REQUIRED_COLS = ['标段名称', '物资名称', '下单时间', '需求量']
-            missing_cols = [col for col in REQUIRED_COLS if col not in df.columns]
-            if missing_cols:
-                st.error(f"缺少必要列: {missing_cols}")
-                return pd.DataFrame()
+        # 处理日期列
+        df["交货时间"] = pd.to_datetime(df["交货时间"], errors="coerce")
 
-            df["物资名称"] = df["物资名称"].astype(str).str.strip().replace({
-                "": "未指定物资", "nan": "未指定物资", "None": "未指定物资", None: "未指定物资"})
+        # 处理文本列
+        df["联系方式"] = df["联系方式"].astype(str)
+        # 再次确保卸货地址列存在并格式化
+        if "卸货地址" in df.columns:
+            df["卸货地址"] = df["卸货地址"].astype(str).replace({"nan": "", "None": ""})
 
-            df[AppConfig.PROJECT_COLUMN] = df.iloc[:, 17].astype(str).str.strip().replace({
-                "": "未指定项目部", "nan": "未指定项目部", "None": "未指定项目部", None: "未指定项目部"})
+        # 生成唯一记录ID
+        df["record_id"] = generate_record_ids(df)
 
-            df["下单时间"] = pd.to_datetime(df["下单时间"], errors='coerce').dt.tz_localize(None)
-            df = df[~df["下单时间"].isna()]
+        # 按交货时间排序（无交货时间的排在最后），日期范围查询使用二分查找
+        df = df.sort_values("交货时间", kind="stable", na_position="last")
 
-            df["需求量"] = safe_convert_to_numeric(df["需求量"]).astype(int)
-            df["已发量"] = safe_convert_to_numeric(df.get("已发量", 0)).astype(int)
-            df["剩余量"] = (df["需求量"] - df["已发量"]).clip(lower=0).astype(int)
+        return df[AppConfig.LOGISTICS_COLUMNS + ["record_id"]]
 
-            if "计划进场时间" in df.columns:
-                df["计划进场时间"] = pd.to_datetime(df["计划进场时间"], errors='coerce').dt.tz_localize(None)
-            
+    except Exception as e:
+        raise ValueError(f"物流数据清洗失败: {str(e)}") from e
+
+
+# 内容哈希缓存：{(路径, mtime_ns, 大小): md5}，文件未被改写时不重复读取整个文件
+_FILE_HASH_MEMO = {}
+
+
+def get_data_file_fingerprint(data_path):
+    """计算数据文件指纹（内容MD5），mtime和大小未变时直接复用上次结果"""
+    stat = os.stat(data_path)
+    memo_key = (data_path, stat.st_mtime_ns, stat.st_size)
+    digest = _FILE_HASH_MEMO.get(memo_key)
+    if digest is None:
+        hasher = hashlib.md5()
+        with open(data_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()
+        _FILE_HASH_MEMO.clear()
+        _FILE_HASH_MEMO[memo_key] = digest
+    return digest
+
+
+def snapshot_paths(data_version):
+    """快照文件路径，文件名包含格式版本和数据指纹"""
+    tag = f"v{AppConfig.SNAPSHOT_SCHEMA_VERSION}-{data_version}"
+    return (
+        os.path.join(AppConfig.SNAPSHOT_DIR, f"plan-{tag}.parquet"),
+        os.path.join(AppConfig.SNAPSHOT_DIR, f"logistics-{tag}.parquet"),
+    )
+
+
+def to_columnar_safe(df):
+    """将混合类型的文本列统一为字符串，保证可写入 Parquet"""
+    df.columns = [str(col) for col in df.columns]
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            inferred = pd.api.types.infer_dtype(df[col], skipna=True)
+            if inferred not in ("string", "empty"):
+                df[col] = df[col].map(lambda v: v if pd.isna(v) else str(v))
+    return df
+
+
+def compact_text_columns(df, columns):
+    """将重复值较多的文本列转为分类类型"""
+    for col in columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def to_status_category(series):
+    """到货状态转为分类类型，类别固定为 STATUS_OPTIONS（另含状态库中出现的其他取值）"""
+    extra = sorted(set(series.dropna().unique()) - set(AppConfig.STATUS_OPTIONS))
+    return series.astype(pd.CategoricalDtype(AppConfig.STATUS_OPTIONS + extra))
+
+
+def read_workbook_snapshot(data_version):
+    """读取与数据指纹匹配的列式快照，不存在、损坏或计划数据为空表时返回 None"""
+    plan_path, logistics_path = snapshot_paths(data_version)
+    if not (os.path.exists(plan_path) and os.path.exists(logistics_path)):
+        return None
+    try:
+        plan_df, logistics_df = pd.read_parquet(plan_path), pd.read_parquet(logistics_path)
+    except Exception:
+        return None
+    # 旧版本清洗失败时曾把无列的空表写成快照，此类快照视为缺失，重新解析 Excel
+    if len(plan_df.columns) == 0:
+        return None
+    return plan_df, logistics_df
+
+
+def write_workbook_snapshot(data_version, plan_df, logistics_df):
+    """原子写入列式快照并清理旧快照，写入失败时静默回退到 Excel 解析"""
+    plan_path, logistics_path = snapshot_paths(data_version)
+    try:
+        os.makedirs(AppConfig.SNAPSHOT_DIR, exist_ok=True)
+        # 先写物流表再写计划表，两个文件都存在即代表快照完整
+        for df, path in ((logistics_df, logistics_path), (plan_df, plan_path)):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            df.to_parquet(tmp_path)
+            os.replace(tmp_path, path)
+
+        keep = {os.path.basename(plan_path), os.path.basename(logistics_path)}
+        for name in os.listdir(AppConfig.SNAPSHOT_DIR):
+            if name.endswith(".parquet") and name not in keep:
+                os.remove(os.path.join(AppConfig.SNAPSHOT_DIR, name))
+        return True
+    except Exception:
+        return False
+
+
+EXCEL_ERROR_VALUES = {"#NULL!", "#DIV/0!", "#VALUE!", "#REF!", "#NAME?", "#NUM!", "#N/A"}
+
+
+def excel_cell_value(value):
+    """按 pd.read_excel 的规则转换单元格值：空单元格为空串，整数值的浮点数转为整数，错误值为 NaN"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else value
+    if isinstance(value, str) and value in EXCEL_ERROR_VALUES:
+        return float("nan")
+    return value
+
+
+def read_sheet_projected(worksheet, column_names, column_positions):
+    """流式读取只读工作表，只保留需要的列
+
+    column_names 按表头名称取列（同名时取第一列），column_positions 按列序号取列（从0开始，
+    结果列名见 column_position_name）。单元格转换和类型推断与 pd.read_excel 一致。
+    """
+    worksheet.reset_dimensions()
+    rows = worksheet.iter_rows(values_only=True)
+    header = next(rows, None)
+    if header is None:
+        return pd.DataFrame()
+
+    header = list(header)
+    picks, names = [], []
+    for name in dict.fromkeys(column_names):
+        if name in header:
+            picks.append(header.index(name))
+            names.append(name)
+    for position in column_positions:
+        picks.append(position)
+        names.append(column_position_name(position))
+
+    data = []
+    last_row_with_data = -1
+    for row in rows:
+        width = len(row)
+        data.append([excel_cell_value(row[i]) if i < width else "" for i in picks])
+        if row.count(None) != width:
+            last_row_with_data = len(data) - 1
+    # 与 pd.read_excel 相同，去掉末尾的空行
+    data = data[:last_row_with_data + 1]
+    if not data:
+        return pd.DataFrame(columns=names)
+
+    return TextParser(data, names=names, header=None, skip_blank_lines=False).read()
+
+
+@timed("读取Excel")
+def read_workbook_raw(data_path, projected=None):
+    """读取工作簿原始数据，返回 (计划表, 物流明细表)，没有物流明细表时后者为 None
+
+    projected 为 True 时只读流式读取并只保留清洗所需的列，为 False 时用 pd.read_excel 整表读取。
+    """
+    if projected is None:
+        projected = AppConfig.EXCEL_PROJECTED_READ
+
+    if not projected:
+        with pd.ExcelFile(data_path, engine='openpyxl') as workbook:
+            plan_raw = workbook.parse(0)
+            logistics_raw = None
+            if AppConfig.LOGISTICS_SHEET_NAME in workbook.sheet_names:
+                logistics_raw = workbook.parse(AppConfig.LOGISTICS_SHEET_NAME)
+        return plan_raw, logistics_raw
+
+    plan_names = [col for std_col, alt_cols in AppConfig.BACKUP_COL_MAPPING.items()
+                  for col in [std_col] + alt_cols] + AppConfig.PLAN_EXTRA_COLUMNS
+    workbook = openpyxl.load_workbook(data_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        plan_raw = read_sheet_projected(workbook.worksheets[0], plan_names, AppConfig.PLAN_POSITION_COLUMNS)
+        logistics_raw = None
+        if AppConfig.LOGISTICS_SHEET_NAME in workbook.sheetnames:
+            logistics_raw = read_sheet_projected(
+                workbook[AppConfig.LOGISTICS_SHEET_NAME], AppConfig.LOGISTICS_COLUMNS,
+                AppConfig.LOGISTICS_POSITION_COLUMNS)
+    finally:
+        workbook.close()
+    return plan_raw, logistics_raw
+
+
+def clean_sheet_incremental(raw, clean_func, category_columns, sort_column, previous):
+    """清洗工作表，只处理相对上次加载新增或变化的行，其余行直接复用上次的清洗结果
+
+    以原始行内容哈希判断行是否变化；清洗逻辑逐行独立，但部分转换与列类型有关，
+    因此表头或列类型变化时整表重新清洗。清洗结果以原始行号为索引。
+    返回 (清洗结果, 本次加载状态, 重新清洗的行数)。
+    """
+    row_hashes = pd.util.hash_pandas_object(raw, index=False)
+    signature = (tuple(str(col) for col in raw.columns), tuple(str(dtype) for dtype in raw.dtypes))
+
+    if previous is None or previous["signature"] != signature:
+        cleaned = clean_func(raw)
+        changed_count = len(raw)
+    else:
+        previous_hashes = previous["hashes"]
+        previous_positions = pd.Series(previous_hashes.index, index=previous_hashes.values)
+        previous_positions = previous_positions[~previous_positions.index.duplicated()]
+        matched = row_hashes.map(previous_positions)
+
+        changed_rows = raw[matched.isna()]
+        # 上次清洗时被过滤掉的行，本次同样会被过滤
+        reusable = matched.dropna().astype(int)
+        reusable = reusable[reusable.isin(previous["cleaned"].index)]
+        reused = previous["cleaned"].loc[reusable.values]
+        reused.index = reusable.index
+
+        parts = [reused]
+        if not changed_rows.empty:
+            parts.append(to_columnar_safe(clean_func(changed_rows)))
+        cleaned = pd.concat(parts).sort_index() if len(parts) > 1 else reused
+        cleaned = cleaned.sort_values(sort_column, kind="stable", na_position="last")
+        changed_count = len(changed_rows)
+
+    cleaned = compact_text_columns(to_columnar_safe(cleaned), category_columns)
+    state = {"signature": signature, "hashes": row_hashes, "cleaned": cleaned}
+    return cleaned, state, changed_count
+
+
+@timed("解析工作簿")
+def load_workbook_data(data_path, data_version, previous_state=None):
+    """单次打开工作簿，一次性解析发货计划表和物流明细表，返回 (计划数据, 物流数据, 加载状态)
+
+    优先读取同一指纹的 Parquet 快照，快照缺失时才解析 Excel 并重建快照。
+    传入上次的加载状态时只清洗变化的行（见 clean_sheet_incremental）；加载状态中的
+    changes 记录本次相对上次新增、移除的物流记录，warnings 记录工作表缺失等提示，
+    读取快照时加载状态为 None。解析可能在后台线程进行，提示由请求线程展示。
+    解析失败时抛出异常，由调用方决定保留旧数据还是提示错误。
+    """
+    snapshot = read_workbook_snapshot(data_version)
+    if snapshot is not None:
+        return snapshot[0], snapshot[1], None
+
+    plan_raw, logistics_raw = read_workbook_raw(data_path)
+    warnings = []
+    if logistics_raw is None:
+        warnings.append(f"未找到'{AppConfig.LOGISTICS_SHEET_NAME}'工作表")
+    elif logistics_raw.empty:
+        warnings.append("物流明细表为空")
+
+    previous_state = previous_state or {}
+    plan_df, plan_state, plan_changed = clean_sheet_incremental(
+        plan_raw, clean_plan_data, AppConfig.PLAN_CATEGORY_COLUMNS, "下单时间", previous_state.get("plan"))
+    if logistics_raw is None:
+        logistics_df = compact_text_columns(
+            to_columnar_safe(clean_logistics_data(None)), AppConfig.LOGISTICS_CATEGORY_COLUMNS)
+        logistics_state, logistics_changed = None, 0
+    else:
+        logistics_df, logistics_state, logistics_changed = clean_sheet_incremental(
+            logistics_raw, clean_logistics_data, AppConfig.LOGISTICS_CATEGORY_COLUMNS, "交货时间",
+            previous_state.get("logistics"))
+
+    previous_ids = set(previous_state["logistics"]["cleaned"]["record_id"]) \
+        if previous_state.get("logistics") else None
+    current_ids = set(logistics_df["record_id"])
+    # changes 只用于展示。状态合并和统计立方体仍按数据指纹整体重建：2 万行时二者合计不足 0.1 秒，
+    # 重新加载的耗时几乎全在读取 Excel，按记录增量维护下游缓存收益很小
+    changes = {
+        "loaded_at": datetime.now(),
+        "incremental": previous_ids is not None,
+        "plan_changed_rows": plan_changed,
+        "logistics_changed_rows": logistics_changed,
+        "added_record_ids": current_ids - previous_ids if previous_ids is not None else current_ids,
+        "removed_record_ids": previous_ids - current_ids if previous_ids is not None else set(),
+    }
+
+    # 有提示的工作簿不写快照，进程重启后重新解析才能再次给出提示；
+    # 清洗失败会抛出异常走不到这里，无列的计划数据同样视为异常结果，不写入快照
+    if not warnings and len(plan_df.columns) > 0:
+        write_workbook_snapshot(data_version, plan_df, logistics_df)
+    state = {"plan": plan_state, "logistics": logistics_state, "changes": changes, "warnings": warnings}
+    return plan_df, logistics_df, state
+
+
+class WorkbookStore:
+    """进程级工作簿数据仓库
+
+    后台线程轮询数据文件指纹，文件变化后在请求线程之外完成解析，再整体替换当前数据；
+    请求线程只读取已就绪的数据，不必等待解析。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._watcher = None
+        self.data_path = None
+        # 当前数据 (数据指纹, 计划数据, 物流数据)，整体替换，保证版本与数据一致
+        self.snapshot = None
+        # 上次解析 Excel 的加载状态，用于增量清洗和展示数据变化
+        self.load_state = None
+        # 最近一次解析失败的 (路径, 数据指纹)，文件未再变化前后台线程不重复解析
+        self.failed_version = None
+        self.failed_error = None
+
+    def _is_current(self, data_path, data_version):
+        return (self.snapshot is not None and self.data_path == data_path
+                and self.snapshot[0] == data_version)
+
+    def get(self, data_path, data_version):
+        """返回当前数据；指纹已变化时仍返回旧数据并唤醒后台线程，尚无数据时返回 None"""
+        with self._lock:
+            snapshot = self.snapshot
+            is_current = self._is_current(data_path, data_version)
+        if snapshot is not None and not is_current:
+            self._wake.set()
+        return snapshot
+
+    def load(self, data_path, data_version):
+        """解析指定版本的数据并替换当前数据，同一时刻只有一个线程在解析"""
+        with self._load_lock:
+            with self._lock:
+                if self._is_current(data_path, data_version):
+                    return self.snapshot
+            previous_state = self.load_state if self.data_path == data_path else None
+            try:
+                plan_df, logistics_df, load_state = load_workbook_data(data_path, data_version, previous_state)
+            except Exception as e:
+                self.failed_version = (data_path, data_version)
+                self.failed_error = str(e)
+                raise
+            with self._lock:
+                self.data_path = data_path
+                self.snapshot = (data_version, plan_df, logistics_df)
+                self.load_state = load_state
+            self.failed_version = None
+            self.failed_error = None
+            return self.snapshot
+
+    def last_changes(self):
+        """最近一次解析 Excel 相对上次的数据变化，没有记录时返回 None"""
+        with self._lock:
+            return self.load_state["changes"] if self.load_state else None
+
+    def last_warnings(self):
+        """最近一次解析 Excel 产生的提示，没有记录时返回空列表"""
+        with self._lock:
+            return list(self.load_state["warnings"]) if self.load_state else []
+
+    def has_failed(self, data_path, data_version):
+        """该版本的数据文件是否已解析失败过；文件内容不变时重新解析仍会失败"""
+        return self.failed_version == (data_path, data_version)
+
+    def last_error(self):
+        """最近一次解析失败的原因，之后已成功解析时返回 None"""
+        return self.failed_error
+
+    def start_watcher(self):
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, name="workbook-watcher", daemon=True)
+            self._watcher.start()
+
+    def _watch(self):
+        while True:
+            self._wake.wait(AppConfig.WATCHER_INTERVAL_SECONDS)
+            self._wake.clear()
             try:
-                # 获取第16列数据 (索引从0开始，所以是15)
-                df["超期天数"] = safe_convert_to_numeric(df.iloc[:, 15]).astype(int)
+                data_path = locate_data_file()
+                if not data_path:
+                    continue
+                data_version = get_data_file_fingerprint(data_path)
+                # 同一文件内容已解析失败过，等文件再次变化（指纹改变）后再解析
+                if self.has_failed(data_path, data_version):
+                    continue
+                self.load(data_path, data_version)
             except Exception:
-                df["超期天数"] = 0
+                # 文件可能正被 auto_sync.sh 复制，保留旧数据等待下一轮
+                continue
 
-            return df
-    except Exception as e:
-        st.error(f"数据加载失败: {str(e)}")
-        return pd.DataFrame()
 
+@st.cache_resource
+def get_workbook_store():
+    store = WorkbookStore()
+    store.start_watcher()
+    return store
 
-@st.cache_data(ttl=3600)
-def load_logistics_data():
+
+@timed("取工作簿数据")
+def load_workbook_snapshot():
+    """取当前的 (数据指纹, 计划数据, 物流数据)，仅进程首次加载时在请求线程内解析
+
+    返回的是共享数据，调用方不得原地修改；无数据时指纹为 None。
+    """
     data_path = find_data_file()
     if not data_path:
-        return pd.DataFrame(columns=AppConfig.LOGISTICS_COLUMNS + ["record_id"])
+        st.error("❌ 未找到发货计划数据文件")
+        return None, pd.DataFrame(), empty_logistics_df()
 
     try:
-        with st.spinner("正在加载物流数据..."):
-            # 尝试读取物流明细表
-            try:
-                df = pd.read_excel(data_path, sheet_name=AppConfig.LOGISTICS_SHEET_NAME, engine='openpyxl')
-                
-                # 【新增逻辑】强制从 G列 (索引6) 读取数据作为 "卸货地址"
-                # 无论Excel表头是什么，G列被视为卸货地址
-                if df.shape[1] > 6:
-                    df["卸货地址"] = df.iloc[:, 6].astype(str).replace({"nan": "", "None": ""})
-                else:
-                    df["卸货地址"] = ""
-                    
-            except Exception as e:
-                st.warning(f"未找到'{AppConfig.LOGISTICS_SHEET_NAME}'工作表: {str(e)}")
-                return pd.DataFrame(columns=AppConfig.LOGISTICS_COLUMNS + ["record_id"])
-
-            if df.empty:
-                st.warning("物流明细表为空")
-                return pd.DataFrame(columns=AppConfig.LOGISTICS_COLUMNS + ["record_id"])
-
-            # 确保所有必要的列都存在
-            for col in AppConfig.LOGISTICS_COLUMNS:
-                if col not in df.columns:
-                    df[col] = "" if col != "数量" else 0
-
-            # 数据清洗和格式化
-            df["物资名称"] = df["物资名称"].astype(str).str.strip().replace({
-                "": "未指定物资", "nan": "未指定物资", "None": "未指定物资", None: "未指定物资"})
-            df["钢厂"] = df["钢厂"].astype(str).str.strip().replace({
-                "": "未指定钢厂", "nan": "未指定钢厂", "None": "未指定钢厂", None: "未指定钢厂"})
-            df["项目部"] = df["项目部"].astype(str).str.strip().replace({
-                "未指定项目部": "", "nan": "", "None": "", None: ""})
-
-            # 过滤掉项目部为空的数据
-            df = df[df["项目部"] != ""]
-
-            # 安全转换数值列
-            def safe_convert_numeric(series):
-                if series.dtype == 'object':
-                    # 处理字符串中的通配符和非数字字符
-                    cleaned = series.astype(str).str.replace(r'[^\d.-]', '', regex=True)
-                    cleaned = cleaned.replace({'': '0', 'nan': '0', 'None': '0', ' ': '0'})
-                    return pd.to_numeric(cleaned, errors='coerce').fillna(0)
-                else:
-                    return pd.to_numeric(series, errors='coerce').fillna(0)
+        data_version = get_data_file_fingerprint(data_path)
+    except Exception as e:
+        st.error(f"数据加载失败: {str(e)}")
+        return None, pd.DataFrame(), empty_logistics_df()
 
-            df["数量"] = safe_convert_numeric(df["数量"])
+    store = get_workbook_store()
+    snapshot = store.get(data_path, data_version)
+    if snapshot is None and not store.has_failed(data_path, data_version):
+        try:
+            with st.spinner("正在加载基础数据..."):
+                snapshot = store.load(data_path, data_version)
+        except Exception:
+            # 失败原因记录在 WorkbookStore 中，由 show_load_warnings 统一提示
+            pass
+    if snapshot is None:
+        return None, pd.DataFrame(), empty_logistics_df()
 
-            # 处理日期列
-            df["交货时间"] = pd.to_datetime(df["交货时间"], errors="coerce")
+    return snapshot
 
-            # 处理文本列
-            df["联系方式"] = df["联系方式"].astype(str)
-            # 再次确保卸货地址列存在并格式化
-            if "卸货地址" in df.columns:
-                df["卸货地址"] = df["卸货地址"].astype(str).replace({"nan": "", "None": ""})
 
-            # 生成唯一记录ID
-            df["record_id"] = df.apply(generate_record_id, axis=1)
+def load_workbook_frames():
+    """取当前的 (计划数据, 物流数据)，为共享只读数据"""
+    _, plan_df, logistics_df = load_workbook_snapshot()
+    return plan_df, logistics_df
 
-            return df[AppConfig.LOGISTICS_COLUMNS + ["record_id"]]
 
-    except Exception as e:
-        st.error(f"物流数据加载失败: {str(e)}")
-        # 返回一个空的DataFrame，包含必要的列
-        return pd.DataFrame(columns=AppConfig.LOGISTICS_COLUMNS + ["record_id"])
+def load_data():
+    return load_workbook_frames()[0]
+
+
+def load_logistics_data():
+    return load_workbook_frames()[1]
 
 
 # ==================== 物流状态管理 ====================
-def load_logistics_status():
-    """加载物流状态，只包含到货状态"""
-    if os.path.exists(AppConfig.LOGISTICS_STATUS_FILE):
-        try:
-            with st.spinner("加载物流状态..."):
-                status_df = pd.read_csv(AppConfig.LOGISTICS_STATUS_FILE)
-                if "record_id" not in status_df.columns:
-                    status_df["record_id"] = ""
-                if "update_time" not in status_df.columns:
-                    status_df["update_time"] = datetime.now().strftime(AppConfig.DATE_FORMAT)
-                if "物流信息" in status_df.columns:
-                    status_df = status_df.drop(columns=["物流信息"])
-                return status_df
-        except Exception as e:
-            st.error(f"加载物流状态文件失败: {str(e)}")
-            return pd.DataFrame(columns=["record_id", "到货状态", "update_time"])
-    return pd.DataFrame(columns=["record_id", "到货状态", "update_time"])
+class LogisticsStatusStore:
+    """基于 SQLite 的物流状态存储，以 record_id 为主键，单条读写不再加载和重写整个文件
+
+    支持多个线程、进程同时写入：WAL 模式下读写互不阻塞，写事务以 BEGIN IMMEDIATE 开始，
+    写锁被占用时按 busy timeout 等待。每行带版本号，每次写入加一；写入时可传入读取时的版本号，
+    版本已变化的记录视为冲突不写入（乐观并发控制），避免覆盖他人刚保存的状态。
+    """
+
+    def __init__(self, db_path, legacy_csv_path=None):
+        self.db_path = db_path
+        self._init_db(legacy_csv_path)
+
+    def _connect(self):
+        # isolation_level=None：由 _transaction 显式控制事务边界
+        conn = sqlite3.connect(self.db_path, timeout=AppConfig.STATUS_DB_BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        conn.execute("PRAGMA synchronous = NORMAL")
+        return closing(conn)
+
+    @contextmanager
+    def _transaction(self):
+        """写事务：开始即取得写锁，事务内先读后写不会被其他写入者插入，异常时整体回滚"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _init_db(self, legacy_csv_path):
+        if AppConfig.STATUS_DB_WAL:
+            with self._connect() as conn:
+                conn.execute("PRAGMA journal_mode = WAL")
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS logistics_status ("
+                "record_id TEXT PRIMARY KEY, status TEXT NOT NULL, update_time TEXT NOT NULL, "
+                "version INTEGER NOT NULL DEFAULT 0)"
+            )
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(logistics_status)")]
+            if "version" not in columns:
+                conn.execute("ALTER TABLE logistics_status ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            conn.execute("CREATE TABLE IF NOT EXISTS status_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO status_meta (key, value) VALUES ('version', 0)")
+            migrated = conn.execute("SELECT value FROM status_meta WHERE key = 'migrated'").fetchone()
+            if migrated is None:
+                if legacy_csv_path and os.path.exists(legacy_csv_path):
+                    self._import_csv(conn, legacy_csv_path)
+                conn.execute("INSERT INTO status_meta (key, value) VALUES ('migrated', 1)")
+
+    @staticmethod
+    def _import_csv(conn, csv_path):
+        legacy_df = pd.read_csv(csv_path, dtype=str)
+        if "record_id" not in legacy_df.columns or "到货状态" not in legacy_df.columns:
+            return
+        if "update_time" not in legacy_df.columns:
+            legacy_df["update_time"] = datetime.now().strftime(AppConfig.DATE_FORMAT)
+        legacy_df = legacy_df.dropna(subset=["record_id", "到货状态"]).drop_duplicates("record_id", keep="last")
+        legacy_df["update_time"] = legacy_df["update_time"].fillna(datetime.now().strftime(AppConfig.DATE_FORMAT))
+        conn.executemany(
+            "INSERT OR REPLACE INTO logistics_status (record_id, status, update_time) VALUES (?, ?, ?)",
+            legacy_df[["record_id", "到货状态", "update_time"]].itertuples(index=False, name=None)
+        )
+
+    @staticmethod
+    def _bump_version(conn):
+        conn.execute("UPDATE status_meta SET value = value + 1 WHERE key = 'version'")
+
+    @staticmethod
+    def _select_by_ids(conn, column, record_ids):
+        """返回 {record_id: column 值}，没有记录的ID不在结果中"""
+        record_ids = list(dict.fromkeys(record_ids))
+        result = {}
+        # SQLite 单条语句的参数个数有限，分块查询
+        for i in range(0, len(record_ids), 500):
+            chunk = record_ids[i:i + 500]
+            placeholders = ",".join("?" * len(chunk))
+            result.update(conn.execute(
+                f"SELECT record_id, {column} FROM logistics_status WHERE record_id IN ({placeholders})",
+                chunk
+            ).fetchall())
+        return result
+
+    def get(self, record_id):
+        """返回记录的到货状态，没有记录时返回 None"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT status FROM logistics_status WHERE record_id = ?", (record_id,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, record_id, status):
+        """写入单条记录的到货状态（存在则更新，不存在则新增）"""
+        self.put_statuses({record_id: status})
+
+    def get_many(self, record_ids):
+        """批量读取到货状态，返回 {record_id: 状态}，没有记录的ID不在结果中"""
+        with self._connect() as conn:
+            return self._select_by_ids(conn, "status", record_ids)
+
+    def get_versions(self, record_ids):
+        """批量读取行版本号，返回 {record_id: 版本号}，没有记录的ID版本号视为 0（不在结果中）"""
+        with self._connect() as conn:
+            return self._select_by_ids(conn, "version", record_ids)
+
+    def put_many(self, record_ids, status):
+        """在一个事务内把多条记录写为同一状态"""
+        self.put_statuses({record_id: status for record_id in record_ids})
+
+    def put_statuses(self, statuses, expected_versions=None):
+        """在一个事务内写入 {record_id: 状态}，各记录可以是不同状态，返回因版本冲突未写入的 record_id 集合
+
+        expected_versions 为 {record_id: 读取时的版本号}（没有记录时为 0），其中版本已变化的记录不写入；
+        不在 expected_versions 中的记录直接写入。
+        """
+        update_time = datetime.now().strftime(AppConfig.DATE_FORMAT)
+        with self._transaction() as conn:
+            conflicts = set()
+            if expected_versions:
+                current = self._select_by_ids(conn, "version", expected_versions)
+                conflicts = {record_id for record_id, version in expected_versions.items()
+                             if current.get(record_id, 0) != version}
+            rows = [(record_id, status, update_time) for record_id, status in statuses.items()
+                    if record_id not in conflicts]
+            if rows:
+                conn.executemany(
+                    "INSERT INTO logistics_status (record_id, status, update_time, version) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT(record_id) DO UPDATE SET status = excluded.status, "
+                    "update_time = excluded.update_time, version = logistics_status.version + 1",
+                    rows
+                )
+                self._bump_version(conn)
+        return conflicts
+
+    def version(self):
+        """状态数据版本号，每次写入递增"""
+        with self._connect() as conn:
+            return conn.execute("SELECT value FROM status_meta WHERE key = 'version'").fetchone()[0]
+
+    def last_update_time(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT MAX(update_time) FROM logistics_status").fetchone()[0]
+
+    def load_all(self):
+        with self._connect() as conn:
+            status_df = pd.read_sql_query(
+                "SELECT record_id, status AS 到货状态, update_time, version AS status_version FROM logistics_status",
+                conn)
+        return status_df
+
+
+@st.cache_resource
+def get_status_store():
+    return LogisticsStatusStore(AppConfig.LOGISTICS_STATUS_DB, AppConfig.LOGISTICS_STATUS_FILE)
 
 
-def save_logistics_status(status_df):
+@timed("读取到货状态")
+def load_logistics_status():
+    """加载物流状态，只包含到货状态"""
     try:
-        with st.spinner("保存状态..."):
-            status_df.to_csv(AppConfig.LOGISTICS_STATUS_FILE, index=False, encoding='utf-8-sig')
-            return True
+        with st.spinner("加载物流状态..."):
+            return get_status_store().load_all()
     except Exception as e:
-        st.error(f"状态保存失败: {str(e)}")
-        return False
+        st.error(f"加载物流状态失败: {str(e)}")
+        return pd.DataFrame(columns=["record_id", "到货状态", "update_time", "status_version"])
+
+
+def apply_default_status_rules(logistics_df, current_date):
+    """按 DEFAULT_STATUS_RULES 批量计算默认到货状态，返回与 logistics_df 对齐的 Series"""
+    delivery_time = logistics_df["交货时间"]
+    default_status = pd.Series(AppConfig.DEFAULT_STATUS, index=logistics_df.index, dtype=object)
+    unassigned = pd.Series(True, index=logistics_df.index)
 
+    for rule in AppConfig.DEFAULT_STATUS_RULES:
+        in_scope = unassigned.copy()
+        for scope_col in AppConfig.DEFAULT_STATUS_RULE_SCOPES:
+            if scope_col in rule:
+                values = rule[scope_col]
+                values = [values] if isinstance(values, str) else list(values)
+                in_scope &= logistics_df[scope_col].isin(values)
 
-def merge_logistics_with_status(logistics_df):
-    """合并物流数据和状态数据，添加3天自动到货逻辑，默认状态为钢厂已接单"""
+        # 交货日期早于截止日 等价于 交货时间早于截止日零点；NaT 比较结果为 False
+        cutoff = pd.Timestamp(current_date - timedelta(days=rule["lead_days"]))
+        default_status[in_scope & (delivery_time < cutoff)] = rule["status"]
+        unassigned &= ~in_scope
+
+    return default_status
+
+
+@timed("合并到货状态")
+def merge_logistics_with_status(logistics_df, current_date=None):
+    """合并物流数据和状态数据，未设置状态的记录按默认状态规则补齐（默认3天自动到货，否则钢厂已接单）
+
+    status_version 为状态库中的行版本号（未保存过状态为 0），保存时用于检查是否已被他人修改。
+    """
     if logistics_df.empty:
         return logistics_df
 
+    if current_date is None:
+        current_date = datetime.now().date()
+
     status_df = load_logistics_status()
-    
-    current_date = datetime.now().date()
-    three_days_ago = current_date - timedelta(days=3)
-    
+
     if status_df.empty:
-        logistics_df["到货状态"] = logistics_df.apply(
-            lambda row: "已到货" if (
-                pd.notna(row["交货时间"]) and 
-                row["交货时间"].date() < three_days_ago
-            ) else "钢厂已接单",
-            axis=1
-        )
+        logistics_df["到货状态"] = to_status_category(apply_default_status_rules(logistics_df, current_date))
+        logistics_df["status_version"] = 0
         return logistics_df
 
-    required_status_cols = ["record_id", "到货状态"]
-    for col in required_status_cols:
-        if col not in status_df.columns:
-            status_df[col] = ""
-    
     merged = pd.merge(
         logistics_df,
-        status_df[required_status_cols],
+        status_df[["record_id", "到货状态", "status_version"]],
         on="record_id",
         how="left",
         suffixes=("", "_status")
     )
-    
-    if "到货状态_status" in merged.columns:
-        mask_no_status = merged["到货状态_status"].isna()
-        mask_old_delivery = merged["交货时间"].apply(
-            lambda x: pd.notna(x) and x.date() < three_days_ago
-        )
-        
-        merged.loc[mask_no_status & mask_old_delivery, "到货状态"] = "已到货"
-        merged.loc[mask_no_status & ~mask_old_delivery, "到货状态"] = "钢厂已接单"
-        merged.loc[~mask_no_status, "到货状态"] = merged.loc[~mask_no_status, "到货状态_status"]
-        merged = merged.drop(columns=["到货状态_status"])
-    else:
-        merged["到货状态"] = merged.apply(
-            lambda row: "已到货" if (
-                pd.notna(row["交货时间"]) and 
-                row["交货时间"].date() < three_days_ago
-            ) else "钢厂已接单",
-            axis=1
-        )
-    
-    return merged
 
+    saved_status = merged["到货状态_status"]
+    merged["到货状态"] = to_status_category(saved_status.where(
+        saved_status.notna(), apply_default_status_rules(merged, current_date)))
+    merged["status_version"] = merged["status_version"].fillna(0).astype("int64")
+    return merged.drop(columns=["到货状态_status"])
+
+
+def slice_date_range(df, column, start_date, end_date):
+    """取 column 日期落在 [start_date, end_date]（含首尾两天）内的行
+
+    df 须已按 column 升序排列（加载时已排序，空值在最后），按项目部拆分和合并状态都会保持该顺序，
+    因此可用二分查找定位上下界，无需逐行比较。
+    """
+    if df.empty:
+        return df
+    values = df[column].to_numpy()
+    lower = values.searchsorted(pd.Timestamp(start_date).to_datetime64(), side="left")
+    upper = values.searchsorted((pd.Timestamp(end_date) + timedelta(days=1)).to_datetime64(), side="left")
+    return df.iloc[lower:upper]
+
+
+def filter_project(df, column, project):
+    if project is None or project == "中铁物贸成都分公司" or df.empty:
+        return df
+    return df[df[column] == project]
+
+
+def text_match_mask(series, keyword):
+    """列值包含关键字（不区分大小写）的行；分类列只需在类别上匹配一次"""
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        categories = series.cat.categories
+        matched = categories[categories.astype(str).str.contains(keyword, case=False, regex=False)]
+        return series.isin(matched)
+    return series.fillna("").astype(str).str.contains(keyword, case=False, regex=False)
+
+
+def filter_logistics_view(df, keyword, statuses, sort_column, ascending=True):
+    """按关键字、到货状态筛选并排序物流记录，返回视图供分页
+
+    df 已按交货时间升序排列，按交货时间升序查看时不再排序。
+    """
+    if keyword:
+        mask = pd.Series(False, index=df.index)
+        for col in AppConfig.LOGISTICS_SEARCH_COLUMNS:
+            if col in df.columns:
+                mask |= text_match_mask(df[col], keyword)
+        df = df[mask]
+    if statuses:
+        df = df[df["到货状态"].isin(statuses)]
+    if sort_column != "交货时间" or not ascending:
+        df = df.sort_values(sort_column, ascending=ascending, kind="stable", na_position="last")
+    return df
+
+
+@st.cache_resource(max_entries=8, show_spinner=False)
+def get_project_partitions(cache_key, column, _df):
+    """按项目部一次性拆分数据，返回 {项目部: 子表}；cache_key 需包含数据版本
+
+    子表为各会话共享的只读数据，使用方不得原地修改。
+    """
+    return {project: part for project, part in _df.groupby(column, sort=False, observed=True)}
 
-def update_logistics_status(record_id, new_status, original_row=None):
-    """更新物流状态（带错误处理）"""
-    try:
-        status_df = load_logistics_status()
-
-        if new_status is None:
-            new_status = "公司统筹中"
-        new_status = str(new_status).strip()
-
-        send_notification = False
-        if new_status == "未到货":
-            existing_status = status_df.loc[status_df["record_id"] == record_id, "到货状态"]
-            if len(existing_status) == 0 or existing_status.iloc[0] != "未到货":
-                send_notification = True
-
-        if record_id in status_df["record_id"].values:
-            status_df.loc[status_df["record_id"] == record_id, "到货状态"] = new_status
-            status_df.loc[status_df["record_id"] == record_id, "update_time"] = datetime.now().strftime(
-                AppConfig.DATE_FORMAT)
-        else:
-            new_record = pd.DataFrame([{
-                "record_id": record_id,
-                "到货状态": new_status,
-                "update_time": datetime.now().strftime(AppConfig.DATE_FORMAT)
-            }])
-            status_df = pd.concat([status_df, new_record], ignore_index=True)
-
-        if save_logistics_status(status_df):
-            if send_notification and original_row is not None:
-                material_info = {
-                    "物资名称": original_row["物资名称"],
-                    "规格型号": original_row["规格型号"],
-                    "数量": original_row["数量"],
-                    "交货时间": original_row["交货时间"].strftime("%Y-%m-%d %H:%M") if pd.notna(
-                        original_row["交货时间"]) else "未知",
-                    "项目部": original_row["项目部"]
-                }
-                if send_feishu_notification(material_info):
-                    st.toast("已发送物流异常通知到相关负责人", icon="📨")
-            return True
-        return False
 
+@st.cache_resource(max_entries=4, show_spinner=False)
+def merge_logistics_with_status_cached(data_version, status_version, current_date, _logistics_df):
+    """按 (数据指纹, 状态版本, 当天日期) 缓存合并结果，只有工作簿变化或状态写入后才重新合并
+
+    合并结果在各会话间共享（不再每次读取都反序列化一份副本），使用方不得原地修改。
+    """
+    return merge_logistics_with_status(_logistics_df.copy(deep=False), current_date)
+
+
+def load_merged_logistics_data(project=None):
+    """取已合并到货状态的物流数据；指定项目部时直接取预先拆分好的该项目部子表"""
+    data_version, _, logistics_df = load_workbook_snapshot()
+    if data_version is None or logistics_df.empty:
+        merged = merge_logistics_with_status(logistics_df.copy(deep=False))
+        return filter_project(merged, "项目部", project)
+    try:
+        status_version = get_status_store().version()
     except Exception as e:
-        st.error(f"更新状态时出错: {str(e)}")
-        return False
+        st.error(f"加载物流状态失败: {str(e)}")
+        merged = merge_logistics_with_status(logistics_df.copy(deep=False))
+        return filter_project(merged, "项目部", project)
 
+    current_date = datetime.now().date()
+    merged = merge_logistics_with_status_cached(data_version, status_version, current_date, logistics_df)
+    if project is None or project == "中铁物贸成都分公司":
+        return merged
+    partitions = get_project_partitions(("logistics", data_version, status_version, current_date), "项目部", merged)
+    return partitions.get(project, merged.iloc[0:0])
 
-def batch_update_logistics_status(record_ids, new_status, original_rows=None):
-    """批量更新物流状态"""
+
+def load_project_plan_data(project):
+    """取项目部的发货计划子表，总部视图返回全部计划"""
+    data_version, plan_df, _ = load_workbook_snapshot()
+    if project == "中铁物贸成都分公司" or plan_df.empty:
+        return plan_df
+    if data_version is None:
+        return filter_project(plan_df, AppConfig.PROJECT_COLUMN, project)
+    partitions = get_project_partitions(("plan", data_version), AppConfig.PROJECT_COLUMN, plan_df)
+    return partitions.get(project, plan_df.iloc[0:0])
+
+
+STATISTICS_CUBE_COLUMNS = ["日期", "项目部", "钢厂", "到货状态", "数量", "发货单数"]
+
+
+def build_statistics_cube(merged_df):
+    """按 日期×项目部×钢厂×到货状态 预聚合发货量和发货单数，按日期升序排列
+
+    任意日期范围的统计都由立方体切片汇总得到，计算量与原始记录数无关；无交货时间的记录不计入。
+    """
+    if merged_df.empty or "到货状态" not in merged_df.columns:
+        return pd.DataFrame(columns=STATISTICS_CUBE_COLUMNS)
+    day = merged_df["交货时间"].dt.normalize().rename("日期")
+    cube = merged_df.groupby([day, "项目部", "钢厂", "到货状态"], observed=True).agg(
+        数量=("数量", "sum"), 发货单数=("record_id", "count")).reset_index()
+    return cube[STATISTICS_CUBE_COLUMNS]
+
+
+@st.cache_resource(max_entries=4, show_spinner=False)
+def get_statistics_cube(data_version, status_version, current_date, _merged_df):
+    """按 (数据指纹, 状态版本, 当天日期) 缓存统计立方体，与合并结果同步失效；共享只读"""
+    return build_statistics_cube(_merged_df)
+
+
+@timed("统计立方体")
+def load_statistics_cube():
+    """取全部物流记录的统计立方体"""
+    data_version = load_workbook_snapshot()[0]
     try:
-        status_df = load_logistics_status()
-        
-        if new_status is None:
-            new_status = "公司统筹中"
-        new_status = str(new_status).strip()
+        # 先取状态版本再取合并数据：期间有新写入时缓存键偏旧，下次读取会重建，不会缓存过期数据
+        status_version = get_status_store().version() if data_version is not None else None
+    except Exception:
+        status_version = None
+    merged = load_merged_logistics_data()
+    if status_version is None:
+        return build_statistics_cube(merged)
+    return get_statistics_cube(data_version, status_version, datetime.now().date(), merged)
+
+
+def build_material_info(original_row):
+    """从物流记录中提取通知所需的物资信息"""
+    return {
+        "物资名称": original_row["物资名称"],
+        "规格型号": original_row["规格型号"],
+        "数量": original_row["数量"],
+        "交货时间": original_row["交货时间"].strftime("%Y-%m-%d %H:%M") if pd.notna(
+            original_row["交货时间"]) else "未知",
+        "项目部": original_row["项目部"]
+    }
 
-        success_count = 0
-        error_count = 0
-        
-        for i, record_id in enumerate(record_ids):
-            try:
-                original_row = original_rows[i] if original_rows and i < len(original_rows) else None
-                
-                send_notification = False
-                if new_status == "未到货":
-                    existing_status = status_df.loc[status_df["record_id"] == record_id, "到货状态"]
-                    if len(existing_status) == 0 or existing_status.iloc[0] != "未到货":
-                        send_notification = True
-
-                if record_id in status_df["record_id"].values:
-                    status_df.loc[status_df["record_id"] == record_id, "到货状态"] = new_status
-                    status_df.loc[status_df["record_id"] == record_id, "update_time"] = datetime.now().strftime(
-                        AppConfig.DATE_FORMAT)
-                else:
-                    new_record = pd.DataFrame([{
-                        "record_id": record_id,
-                        "到货状态": new_status,
-                        "update_time": datetime.now().strftime(AppConfig.DATE_FORMAT)
-                    }])
-                    status_df = pd.concat([status_df, new_record], ignore_index=True)
-
-                if send_notification and original_row is not None:
-                    material_info = {
-                        "物资名称": original_row["物资名称"],
-                        "规格型号": original_row["规格型号"],
-                        "数量": original_row["数量"],
-                        "交货时间": original_row["交货时间"].strftime("%Y-%m-%d %H:%M") if pd.notna(
-                            original_row["交货时间"]) else "未知",
-                        "项目部": original_row["项目部"]
-                    }
-                    send_feishu_notification(material_info)
-                
-                success_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                st.error(f"更新记录 {record_id} 时出错: {str(e)}")
-                continue
 
-        if save_logistics_status(status_df):
-            return success_count, error_count
-        else:
-            return 0, len(record_ids)
-            
+def normalize_status(status):
+    return "公司统筹中" if status is None else str(status).strip()
+
+
+@timed("保存到货状态")
+def save_logistics_statuses(statuses, original_rows=None, check_versions=True):
+    """一次写入 {record_id: 新状态}：一个事务内检查版本并写入全部记录，返回 (成功数, 失败数, 冲突的 record_id 集合)
+
+    original_rows 为 {record_id: 物流记录}。check_versions 为 True 时以记录中的 status_version 做乐观并发检查，
+    读取后已被他人修改的记录不写入并提示；改为"未到货"的记录（原状态不是"未到货"）发送飞书通知。
+    """
+    if not statuses:
+        return 0, 0, set()
+
+    statuses = {record_id: normalize_status(status) for record_id, status in statuses.items()}
+    original_rows = original_rows or {}
+    expected_versions = None
+    if check_versions:
+        expected_versions = {record_id: int(row["status_version"]) for record_id, row in original_rows.items()
+                             if record_id in statuses and "status_version" in row}
+    try:
+        store = get_status_store()
+        overdue_ids = [record_id for record_id, status in statuses.items() if status == "未到货"]
+        previous_status = store.get_many(overdue_ids) if overdue_ids else {}
+        conflicts = store.put_statuses(statuses, expected_versions)
+
     except Exception as e:
-        st.error(f"批量更新状态时出错: {str(e)}")
-        return 0, len(record_ids)
+        st.error(f"保存状态时出错: {str(e)}")
+        return 0, len(statuses), set()
+
+    if conflicts:
+        st.toast(f"有 {len(conflicts)} 条记录已被他人修改，本次更改未保存，已刷新为最新状态", icon="⚠️")
+
+    notified = 0
+    for record_id in overdue_ids:
+        original_row = original_rows.get(record_id)
+        if original_row is None or record_id in conflicts or previous_status.get(record_id) == "未到货":
+            continue
+        try:
+            if send_feishu_notification(build_material_info(original_row)):
+                notified += 1
+        except Exception as e:
+            st.error(f"记录 {record_id} 通知发送失败: {str(e)}")
+    if notified:
+        st.toast(f"已提交 {notified} 条物流异常通知，将在后台发送给相关负责人", icon="📨")
+
+    return len(statuses) - len(conflicts), 0, conflicts
+
+
+def update_logistics_status(record_id, new_status, original_row=None):
+    """更新单条物流状态，成功返回 True"""
+    original_rows = {record_id: original_row} if original_row is not None else None
+    return save_logistics_statuses({record_id: new_status}, original_rows)[0] == 1
+
+
+def batch_update_logistics_status(record_ids, new_status, original_rows=None):
+    """把多条记录批量更新为同一状态，返回 (成功数, 失败数)，版本冲突的记录计入失败数"""
+    rows_by_id = dict(zip(record_ids, original_rows)) if original_rows else None
+    success_count, error_count, conflicts = save_logistics_statuses(
+        {record_id: new_status for record_id in record_ids}, rows_by_id)
+    return success_count, error_count + len(conflicts)
 
 
 # ==================== URL参数处理 ====================
@@ -741,28 +1799,45 @@ def handle_url_parameters():
                     del st.session_state['temp_selected_project']
 
 
-def get_valid_projects():
-    logistics_df = load_logistics_data()
-    valid_projects = ["中铁物贸成都分公司"]
-    
-    if not logistics_df.empty:
-        current_date = datetime.now().date()
-        start_date = current_date - timedelta(days=15)
-        end_date = current_date + timedelta(days=15)
+def find_active_projects(logistics_df, current_date):
+    window = timedelta(days=AppConfig.ACTIVE_PROJECT_WINDOW_DAYS)
+    filtered_logistics = slice_date_range(
+        logistics_df, '交货时间', current_date - window, current_date + window)
+    return sorted([p for p in filtered_logistics["项目部"].unique() if p != ""])
 
-        logistics_df = logistics_df.dropna(subset=['交货时间'])
-        logistics_df['交货日期'] = logistics_df['交货时间'].dt.date
 
-        mask = (logistics_df['交货日期'] >= start_date) & (logistics_df['交货日期'] <= end_date)
-        filtered_logistics = logistics_df[mask]
+@st.cache_resource(max_entries=4, show_spinner=False)
+def find_active_projects_cached(data_version, current_date, _logistics_df):
+    """按 (数据指纹, 当天日期) 缓存活跃项目部列表"""
+    return tuple(find_active_projects(_logistics_df, current_date))
 
-        project_list = sorted([p for p in filtered_logistics["项目部"].unique() if p != ""])
-        valid_projects.extend(project_list)
-    
-    return valid_projects
+
+def get_active_projects():
+    """交货时间在今天前后 ACTIVE_PROJECT_WINDOW_DAYS 天内有记录的项目部"""
+    data_version, _, logistics_df = load_workbook_snapshot()
+    if logistics_df.empty:
+        return []
+    current_date = datetime.now().date()
+    if data_version is None:
+        return find_active_projects(logistics_df, current_date)
+    return list(find_active_projects_cached(data_version, current_date, logistics_df))
+
+
+def get_valid_projects():
+    return ["中铁物贸成都分公司"] + get_active_projects()
 
 
 # ==================== 页面组件 ====================
+def rerun_fragment():
+    """只重跑当前片段；片段作为整页运行的一部分执行时不允许片段级重跑，改为整页重跑"""
+    try:
+        st.rerun(scope="fragment")
+    except StreamlitAPIException:
+        st.rerun()
+
+
+@st.fragment
+@timed("页面-物流明细")
 def show_logistics_tab(project):
     yesterday = datetime.now().date() - timedelta(days=1)
     
@@ -777,21 +1852,10 @@ def show_logistics_tab(project):
         return
 
     with st.spinner("加载物流信息..."):
-        logistics_df = load_logistics_data()
-        if project != "中铁物贸成都分公司":
-            logistics_df = logistics_df[logistics_df["项目部"] == project]
+        logistics_df = load_merged_logistics_data(project)
 
         if not logistics_df.empty:
-            logistics_df = merge_logistics_with_status(logistics_df)
-
-            start_date_pd = pd.to_datetime(logistics_start_date)
-            end_date_pd = pd.to_datetime(logistics_end_date) + timedelta(days=1)
-
-            mask = (
-                    (logistics_df["交货时间"] >= start_date_pd) &
-                    (logistics_df["交货时间"] < end_date_pd)
-            )
-            filtered_df = logistics_df[mask].copy()
+            filtered_df = slice_date_range(logistics_df, "交货时间", logistics_start_date, logistics_end_date)
 
             # =============== 统一卡片样式 ===============
             st.markdown('<div class="metric-container">', unsafe_allow_html=True)
@@ -826,53 +1890,83 @@ def show_logistics_tab(project):
 
             st.caption(f"显示 {logistics_start_date} 至 {logistics_end_date} 的数据（共 {len(filtered_df)} 条记录）")
 
+            # =============== 搜索与排序（在服务端完成，只把当前页发送到浏览器） ===============
+            filter_col1, filter_col2, filter_col3, filter_col4 = st.columns([3, 3, 2, 1])
+            with filter_col1:
+                keyword = st.text_input(
+                    "搜索",
+                    placeholder="物资名称、规格型号、钢厂、项目部、卸货地址...",
+                    key="logistics_keyword"
+                ).strip()
+            with filter_col2:
+                status_filter = st.multiselect(
+                    "到货状态",
+                    options=AppConfig.STATUS_OPTIONS,
+                    placeholder="全部状态",
+                    key="logistics_status_filter"
+                )
+            with filter_col3:
+                sort_column = st.selectbox("排序列", AppConfig.LOGISTICS_SORT_COLUMNS, key="logistics_sort")
+            with filter_col4:
+                st.write("")
+                sort_ascending = st.toggle("升序", value=True, key="logistics_sort_ascending")
+
+            view_df = filter_logistics_view(filtered_df, keyword, status_filter, sort_column, sort_ascending)
+
             # =============== 批量更新功能 ===============
             st.markdown("""
             <div class="batch-update-card">
                 <div class="batch-update-title">📦 批量更新到货状态</div>
             </div>
             """, unsafe_allow_html=True)
+
+            # 只为符合搜索条件的前若干条记录生成选项，选项值为 record_id
+            picker_df = view_df.drop_duplicates("record_id").head(AppConfig.BATCH_PICKER_MAX_OPTIONS)
+            picker_labels = dict(zip(
+                picker_df["record_id"],
+                picker_df["物资名称"].astype(str) + " - " + picker_df["规格型号"].astype(str) + " - "
+                + picker_df["钢厂"].astype(str) + " - " + picker_df["数量"].astype(str) + "吨"
+                + " - " + picker_df["交货时间"].dt.strftime("%m-%d %H:%M").fillna("未知")
+            ))
+            if view_df["record_id"].nunique() > len(picker_labels):
+                st.caption(f"可选记录仅列出前 {len(picker_labels)} 条，请通过搜索或状态筛选缩小范围")
+
+            # 选择记录和状态放在表单中，提交前不触发重跑
+            with st.form("batch_update_form", border=False):
+                batch_col1, batch_col2, batch_col3 = st.columns([2, 2, 1])
+
+                with batch_col1:
+                    selected_records = st.multiselect(
+                        "选择要批量更新的记录",
+                        options=list(picker_labels),
+                        format_func=picker_labels.get,
+                        placeholder="选择多条记录进行批量更新..."
+                    )
+
+                with batch_col2:
+                    new_status = st.selectbox(
+                        "选择新的到货状态",
+                        options=AppConfig.STATUS_OPTIONS,
+                        index=0,
+                        key="batch_status"
+                    )
+
+                with batch_col3:
+                    st.write("")
+                    st.write("")
+                    batch_update_btn = st.form_submit_button(
+                        "🚀 批量更新",
+                        type="primary",
+                        use_container_width=True
+                    )
             
-            batch_col1, batch_col2, batch_col3 = st.columns([2, 2, 1])
-            
-            with batch_col1:
-                record_options = []
-                record_mapping = {}
-                for idx, row in filtered_df.iterrows():
-                    display_text = f"{row['物资名称']} - {row['规格型号']} - {row['钢厂']} - {row['数量']}吨"
-                    record_options.append(display_text)
-                    record_mapping[display_text] = row['record_id']
-                
-                selected_records = st.multiselect(
-                    "选择要批量更新的记录",
-                    options=record_options,
-                    placeholder="选择多条记录进行批量更新..."
-                )
-            
-            with batch_col2:
-                new_status = st.selectbox(
-                    "选择新的到货状态",
-                    options=AppConfig.STATUS_OPTIONS,
-                    index=0,
-                    key="batch_status"
-                )
-            
-            with batch_col3:
-                st.write("")
-                st.write("")
-                batch_update_btn = st.button(
-                    "🚀 批量更新",
-                    type="primary",
-                    use_container_width=True,
-                    key="batch_update_btn"
-                )
-            
-            if batch_update_btn and selected_records:
+            if batch_update_btn:
                 if not selected_records:
                     st.warning("请先选择要更新的记录")
                 else:
-                    record_ids = [record_mapping[record] for record in selected_records]
-                    original_rows = [filtered_df[filtered_df['record_id'] == record_id].iloc[0] for record_id in record_ids]
+                    record_ids = list(selected_records)
+                    rows_by_id = picker_df.set_index('record_id', drop=False)
+                    original_rows = [row for _, row in rows_by_id.loc[record_ids].iterrows()]
                     
                     with st.spinner(f"正在批量更新 {len(record_ids)} 条记录..."):
                         success_count, error_count = batch_update_logistics_status(
@@ -885,61 +1979,91 @@ def show_logistics_tab(project):
                         st.success(f"✅ 成功更新 {success_count} 条记录的状态为【{new_status}】")
                         if error_count > 0:
                             st.error(f"❌ 有 {error_count} 条记录更新失败")
-                        st.rerun()
+                        rerun_fragment()
                     else:
                         st.error("❌ 批量更新失败，请重试")
 
+            # =============== 分页 ===============
+            view_signature = (logistics_start_date, logistics_end_date, keyword, tuple(status_filter),
+                              sort_column, sort_ascending, len(view_df))
+            page_col1, page_col2, page_col3 = st.columns([1, 1, 4])
+            with page_col1:
+                page_size = st.selectbox("每页行数", AppConfig.LOGISTICS_PAGE_SIZE_OPTIONS, key="logistics_page_size")
+            page_count = max(1, -(-len(view_df) // page_size))
+            with page_col2:
+                # 筛选条件或记录数变化时换用新的 key，页码回到第一页
+                page_key = hashlib.md5(repr(view_signature + (page_size,)).encode("utf-8")).hexdigest()[:12]
+                page = st.number_input("页码", min_value=1, max_value=page_count, value=1, step=1,
+                                       key=f"logistics_page_{page_key}")
+            with page_col3:
+                st.write("")
+                st.caption(f"第 {page}/{page_count} 页，筛选后共 {len(view_df)} 条记录")
+            page_df = view_df.iloc[(page - 1) * page_size:page * page_size]
+            # 编辑器修改按行号记录，页面内记录顺序变化（他人改状态后重新排序、数据文件更新等）时换用新的 key，
+            # 未保存的修改不会按行号套到另一条记录上
+            editor_generation = st.session_state.get("logistics_editor_generation", 0)
+            page_order = hashlib.md5("\n".join(page_df["record_id"].astype(str)).encode("utf-8")).hexdigest()[:12]
+            editor_key = f"logistics_editor_{project}_{page_key}_{page}_{page_order}_{editor_generation}"
+
             # 准备显示的列（排除record_id和收货地址，保留卸货地址）
-            display_columns = [col for col in filtered_df.columns if col not in ["record_id", "收货地址"]]
-            display_df = filtered_df[display_columns].copy()
+            display_columns = [col for col in page_df.columns if col not in ["record_id", "收货地址", "status_version"]]
+            display_df = page_df[display_columns].copy()
             display_df = display_df.reset_index(drop=True)
+            # 可编辑的文本列改回普通字符串，分类类型不接受类别以外的输入；到货状态保持分类供下拉选择
+            for col in display_df.columns:
+                if col != "到货状态" and isinstance(display_df[col].dtype, pd.CategoricalDtype):
+                    display_df[col] = display_df[col].astype(object)
 
             # 使用自动保存的数据编辑器
             # 去除了特定的宽度设置，允许自动调整；确保文本列为TextColumn以保持左对齐
             st.markdown("**物流明细表** (状态更改会自动保存)")
-            edited_df = st.data_editor(
-                display_df,
-                use_container_width=True,
-                hide_index=True,
-                column_config={
-                    "到货状态": st.column_config.SelectboxColumn(
-                        "到货状态",
-                        options=AppConfig.STATUS_OPTIONS,
-                        default="公司统筹中",
-                        required=True,
-                        # 去除width设置以自动调整
-                    ),
-                    "备注": st.column_config.TextColumn(
-                        "备注",
-                        help="可自由编辑的备注信息",
-                        # 去除width设置以自动调整
-                    ),
-                    "数量": st.column_config.NumberColumn(
-                        "数量",
-                        format="%d",
-                        # 去除width设置以自动调整
-                    ),
-                    "交货时间": st.column_config.DatetimeColumn(
-                        "交货时间",
-                        format="YYYY-MM-DD HH:mm",
-                        # 去除width设置以自动调整
-                    ),
-                    "卸货地址": st.column_config.TextColumn(
-                        "卸货地址",
-                        # 明确指定为TextColumn以确保左对齐
-                    ),
-                    "钢厂": st.column_config.TextColumn("钢厂"),
-                    "物资名称": st.column_config.TextColumn("物资名称"),
-                    "规格型号": st.column_config.TextColumn("规格型号"),
-                    "联系人": st.column_config.TextColumn("联系人"),
-                    "联系方式": st.column_config.TextColumn("联系方式"),
-                    "项目部": st.column_config.TextColumn("项目部"),
-                    # 其他列自动配置
-                },
-                key=f"logistics_editor_{project}"
-            )
+            with timed("物流明细表格渲染"):
+                edited_df = st.data_editor(
+                    display_df,
+                    use_container_width=True,
+                    hide_index=True,
+                    column_config={
+                        "到货状态": st.column_config.SelectboxColumn(
+                            "到货状态",
+                            options=AppConfig.STATUS_OPTIONS,
+                            default="公司统筹中",
+                            required=True,
+                            # 去除width设置以自动调整
+                        ),
+                        "备注": st.column_config.TextColumn(
+                            "备注",
+                            help="可自由编辑的备注信息",
+                            # 去除width设置以自动调整
+                        ),
+                        "数量": st.column_config.NumberColumn(
+                            "数量",
+                            format="%d",
+                            # 去除width设置以自动调整
+                        ),
+                        "交货时间": st.column_config.DatetimeColumn(
+                            "交货时间",
+                            format="YYYY-MM-DD HH:mm",
+                            # 去除width设置以自动调整
+                        ),
+                        "卸货地址": st.column_config.TextColumn(
+                            "卸货地址",
+                            # 明确指定为TextColumn以确保左对齐
+                        ),
+                        "钢厂": st.column_config.TextColumn("钢厂"),
+                        "物资名称": st.column_config.TextColumn("物资名称"),
+                        "规格型号": st.column_config.TextColumn("规格型号"),
+                        "联系人": st.column_config.TextColumn("联系人"),
+                        "联系方式": st.column_config.TextColumn("联系方式"),
+                        "项目部": st.column_config.TextColumn("项目部"),
+                        # 其他列自动配置
+                    },
+                    key=editor_key
+                )
 
-            auto_process_logistics_changes(edited_df, filtered_df, project)
+            # 编辑器的修改按行号对应用户看到的数据，即上次渲染的页面及其 key，而不是本次重新读取的数据
+            rendered_key, rendered_df = st.session_state.get("logistics_editor_base", (editor_key, page_df))
+            auto_process_logistics_changes(edited_df, rendered_df, rendered_key)
+            st.session_state.logistics_editor_base = (editor_key, page_df)
 
             st.markdown("""
             <div class="remark-card logistics-remark">
@@ -949,69 +2073,74 @@ def show_logistics_tab(project):
             </div>
             """, unsafe_allow_html=True)
 
-            status_df = load_logistics_status()
-            if not status_df.empty:
-                last_update = pd.to_datetime(status_df["update_time"]).max()
-                st.caption(f"状态最后更新时间: {last_update.strftime('%Y-%m-%d %H:%M:%S')}")
+            last_update = get_status_store().last_update_time()
+            if last_update:
+                st.caption(f"状态最后更新时间: {pd.to_datetime(last_update).strftime('%Y-%m-%d %H:%M:%S')}")
         else:
             st.info("📭 当前没有物流数据")
 
 
-def auto_process_logistics_changes(edited_df, original_filtered_df, project):
-    """自动处理物流状态更改"""
-    if f'logistics_editor_{project}' not in st.session_state:
+def auto_process_logistics_changes(edited_df, original_filtered_df, editor_key):
+    """自动保存数据编辑器中的到货状态更改
+
+    本次运行的全部更改按 record_id 汇总后一次写入；会话中记住每条记录最近保存的修改（新状态及修改时看到的
+    版本号，最多 STATUS_EDIT_DEDUPE_SIZE 条，最久未用的先淘汰），同一修改在后续重跑中不会重复保存。
+    original_filtered_df 为用户编辑时看到的页面数据，其中的 status_version 用于检查记录是否已被他人修改。
+    保存后换用新的编辑器 key，表格从最新数据重新开始，不再回放已处理的修改。
+    """
+    if editor_key not in st.session_state:
         return
 
-    changed_rows = st.session_state[f'logistics_editor_{project}'].get('edited_rows', {})
+    changed_rows = st.session_state[editor_key].get('edited_rows', {})
 
     if not changed_rows:
         return
 
-    processed_key = f"processed_changes_{project}"
-    if processed_key not in st.session_state:
-        st.session_state[processed_key] = set()
+    applied = st.session_state.setdefault("applied_logistics_status", OrderedDict())
+    pending = {}
+    rows_by_id = {}
+    for row_index, changes in changed_rows.items():
+        if "到货状态" not in changes:
+            continue
+        row_index = int(row_index)
+        if row_index < 0 or row_index >= len(original_filtered_df):
+            continue
 
-    new_changes = []
-    for row_index_str, changes in changed_rows.items():
-        change_hash = f"{row_index_str}_{changes.get('到货状态', '')}"
-        if change_hash not in st.session_state[processed_key]:
-            new_changes.append((row_index_str, changes))
-            st.session_state[processed_key].add(change_hash)
+        original_row = original_filtered_df.iloc[row_index]
+        record_id = original_row["record_id"]
+        new_status = normalize_status(changes["到货状态"])
+        seen_version = int(original_row.get("status_version", 0))
+        if new_status == original_row["到货状态"] or applied.get(record_id) == (new_status, seen_version):
+            continue
+        pending[record_id] = new_status
+        rows_by_id[record_id] = original_row
 
-    if not new_changes:
+    if not pending:
         return
 
-    success_count = 0
-    error_count = 0
+    success_count, error_count, conflicts = save_logistics_statuses(pending, rows_by_id)
 
-    for row_index_str, changes in new_changes:
-        try:
-            row_index = int(row_index_str)
-            if row_index < 0 or row_index >= len(original_filtered_df):
-                error_count += 1
+    if success_count > 0 or conflicts:
+        # 换用新的编辑器 key 丢弃编辑器中已处理的修改，表格显示保存后（或他人修改后）的最新状态；
+        # 同时丢弃上次渲染的页面，重跑时不再按旧 key 处理这些修改
+        st.session_state.logistics_editor_generation = st.session_state.get("logistics_editor_generation", 0) + 1
+        st.session_state.pop("logistics_editor_base", None)
+        for record_id, status in pending.items():
+            if record_id in conflicts:
                 continue
-
-            record_id = original_filtered_df.iloc[row_index]["record_id"]
-            original_row = original_filtered_df.iloc[row_index]
-            new_status = changes.get("到货状态", original_row["到货状态"])
-            status_changed = new_status != original_row["到货状态"]
-            
-            if status_changed:
-                if update_logistics_status(record_id, new_status, original_row):
-                    success_count += 1
-                    st.toast(f"✅ 已自动保存: {original_row['物资名称']} - 状态: {original_row['到货状态']} → {new_status}", icon="✅")
-                else:
-                    error_count += 1
-                    st.toast(f"❌ 保存失败: {original_row['物资名称']}", icon="❌")
-
-        except (ValueError, KeyError, IndexError) as e:
-            error_count += 1
-            continue
-
-    if success_count > 0:
-        st.success(f"已自动保存 {success_count} 条状态更改")
-        time.sleep(3)
-        st.empty()
+            applied[record_id] = (status, int(rows_by_id[record_id].get("status_version", 0)))
+            applied.move_to_end(record_id)
+        while len(applied) > AppConfig.STATUS_EDIT_DEDUPE_SIZE:
+            applied.popitem(last=False)
+
+        if success_count == 1 and not conflicts:
+            record_id, status = next(iter(pending.items()))
+            st.toast(f"✅ 已自动保存: {rows_by_id[record_id]['物资名称']} - 状态: "
+                     f"{rows_by_id[record_id]['到货状态']} → {status}", icon="✅")
+        elif success_count > 0:
+            st.toast(f"✅ 已自动保存 {success_count} 条状态更改", icon="✅")
+        # 重跑物流明细页，使统计卡片和表格显示刚保存的状态
+        rerun_fragment()
 
     if error_count > 0:
         st.error(f"有 {error_count} 条记录保存失败")
@@ -1052,7 +2181,8 @@ def display_metrics_cards(filtered_df):
     st.markdown('</div>', unsafe_allow_html=True)
 
 
-def show_project_selection(df):
+@timed("页面-首页")
+def show_project_selection():
     st.markdown("""
     <div class="welcome-header">
         欢迎使用钢筋发货监控系统
@@ -1089,21 +2219,7 @@ def show_project_selection(df):
     st.markdown('<div class="project-selector">', unsafe_allow_html=True)
 
     with st.spinner("加载项目部信息..."):
-        logistics_df = load_logistics_data()
-        valid_projects = []
-
-        if not logistics_df.empty:
-            current_date = datetime.now().date()
-            start_date = current_date - timedelta(days=15)
-            end_date = current_date + timedelta(days=15)
-
-            logistics_df = logistics_df.dropna(subset=['交货时间'])
-            logistics_df['交货日期'] = logistics_df['交货时间'].dt.date
-
-            mask = (logistics_df['交货日期'] >= start_date) & (logistics_df['交货日期'] <= end_date)
-            filtered_logistics = logistics_df[mask]
-
-            valid_projects = sorted([p for p in filtered_logistics["项目部"].unique() if p != ""])
+        valid_projects = get_active_projects()
 
     selected = st.selectbox(
         "选择项目部",
@@ -1139,7 +2255,9 @@ def show_project_selection(df):
     st.markdown('</div>', unsafe_allow_html=True)
 
 
-def show_plan_tab(df, project):
+@st.fragment
+@timed("页面-发货计划")
+def show_plan_tab(project):
     """显示发货计划标签页"""
     col1, col2 = st.columns(2)
     with col1:
@@ -1152,11 +2270,8 @@ def show_plan_tab(df, project):
         return
         
     with st.spinner("筛选数据..."):
-        filtered_df = df if project == "中铁物贸成都分公司" else df[df[AppConfig.PROJECT_COLUMN] == project]
-        date_range_df = filtered_df[
-            (filtered_df["下单时间"].dt.date >= start_date) &
-            (filtered_df["下单时间"].dt.date <= end_date)
-            ]
+        filtered_df = load_project_plan_data(project)
+        date_range_df = slice_date_range(filtered_df, "下单时间", start_date, end_date)
 
         if not date_range_df.empty:
             display_metrics_cards(date_range_df)
@@ -1177,7 +2292,7 @@ def show_plan_tab(df, project):
             display_df = date_range_df[available_cols.keys()].rename(columns=available_cols)
 
             if "材料名称" in display_df.columns:
-                display_df["材料名称"] = display_df["材料名称"].fillna("未指定物资")
+                display_df["材料名称"] = display_df["材料名称"].astype(object).fillna("未指定物资")
 
             st.dataframe(
                 display_df.style.format({
@@ -1217,48 +2332,62 @@ def show_plan_tab(df, project):
             st.info("该时间段无数据")
 
 
-def show_statistics_tab(df):
+def summarize_logistics(cube):
+    """由统计立方体（或其日期切片）汇总统计面板的全部结果：项目部-钢厂明细、项目部/钢厂排名、到货状态分布和关键指标"""
+    project_factory_stats = cube.groupby(['项目部', '钢厂'], observed=True)[['数量', '发货单数']].sum().reset_index()
+    project_factory_stats['数量'] = project_factory_stats['数量'].round(2)
+
+    status_distribution = cube.groupby('到货状态', observed=True)['发货单数'].sum().sort_values(ascending=False)
+    return {
+        "project_factory": project_factory_stats,
+        "project_quantity": cube.groupby('项目部', observed=True)['数量'].sum().sort_values(ascending=False),
+        "factory_quantity": cube.groupby('钢厂', observed=True)['数量'].sum().sort_values(ascending=False),
+        "status_distribution": status_distribution[status_distribution > 0],
+        "total_quantity": cube['数量'].sum(),
+        "total_orders": int(cube['发货单数'].sum()),
+        "project_count": cube['项目部'].nunique(),
+        "factory_count": cube['钢厂'].nunique(),
+    }
+
+
+@st.fragment
+@timed("页面-数据统计")
+def show_statistics_tab():
     """数据统计面板"""
     st.header("📊 数据统计分析")
     
-    col1, col2, col3 = st.columns([2, 2, 1])
-    with col1:
-        stat_start_date = st.date_input(
-            "统计开始日期",
-            datetime.now().date() - timedelta(days=30),
-            key="stat_start"
-        )
-    with col2:
-        stat_end_date = st.date_input(
-            "统计结束日期", 
-            datetime.now().date(),
-            key="stat_end"
-        )
-    with col3:
-        st.write("")
-        st.write("")
-        if st.button("🔍 生成统计", use_container_width=True):
-            st.rerun()
+    # 日期放在表单中，点击"生成统计"后才按新的日期范围汇总
+    with st.form("stat_range_form", border=False):
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            stat_start_date = st.date_input(
+                "统计开始日期",
+                datetime.now().date() - timedelta(days=30),
+                key="stat_start"
+            )
+        with col2:
+            stat_end_date = st.date_input(
+                "统计结束日期", 
+                datetime.now().date(),
+                key="stat_end"
+            )
+        with col3:
+            st.write("")
+            st.write("")
+            st.form_submit_button("🔍 生成统计", use_container_width=True)
     
     if stat_start_date > stat_end_date:
         st.error("结束日期不能早于开始日期")
         return
         
-    logistics_df = load_logistics_data()
-    if logistics_df.empty:
+    cube = load_statistics_cube()
+    if cube.empty:
         st.info("暂无物流数据可供统计")
         return
         
-    start_date_pd = pd.to_datetime(stat_start_date)
-    end_date_pd = pd.to_datetime(stat_end_date) + timedelta(days=1)
-    
-    mask = (
-        (logistics_df["交货时间"] >= start_date_pd) &
-        (logistics_df["交货时间"] < end_date_pd)
-    )
-    filtered_logistics = logistics_df[mask].copy()
+    cube_range = slice_date_range(cube, "日期", stat_start_date, stat_end_date)
     
-    if filtered_logistics.empty:
+    if cube_range.empty:
         st.info("选定日期范围内无物流数据")
         return
     
@@ -1268,14 +2397,10 @@ def show_statistics_tab(df):
     </div>
     """, unsafe_allow_html=True)
     
-    project_factory_stats = filtered_logistics.groupby(['项目部', '钢厂']).agg({
-        '数量': 'sum',
-        'record_id': 'count'
-    }).rename(columns={'record_id': '发货单数'}).reset_index()
+    summary = summarize_logistics(cube_range)
+    project_factory_stats = summary["project_factory"]
     
     if not project_factory_stats.empty:
-        project_factory_stats['数量'] = project_factory_stats['数量'].round(2)
-        
         st.dataframe(
             project_factory_stats,
             use_container_width=True,
@@ -1305,11 +2430,11 @@ def show_statistics_tab(df):
     </div>
     """, unsafe_allow_html=True)
     
-    total_quantity = filtered_logistics['数量'].sum()
-    total_orders = len(filtered_logistics)
+    total_quantity = summary["total_quantity"]
+    total_orders = summary["total_orders"]
     avg_quantity = total_quantity / total_orders if total_orders > 0 else 0
-    project_count = filtered_logistics['项目部'].nunique()
-    factory_count = filtered_logistics['钢厂'].nunique()
+    project_count = summary["project_count"]
+    factory_count = summary["factory_count"]
     
     cols = st.columns(5)
     metrics = [
@@ -1343,7 +2468,7 @@ def show_statistics_tab(df):
     
     with col1:
         st.markdown("**项目部发货量排名**")
-        project_quantity = filtered_logistics.groupby('项目部')['数量'].sum().sort_values(ascending=False)
+        project_quantity = summary["project_quantity"]
         if not project_quantity.empty:
             st.dataframe(
                 project_quantity.reset_index().rename(columns={'数量': '发货量(吨)'}),
@@ -1355,7 +2480,7 @@ def show_statistics_tab(df):
     
     with col2:
         st.markdown("**钢厂供货量排名**")
-        factory_quantity = filtered_logistics.groupby('钢厂')['数量'].sum().sort_values(ascending=False)
+        factory_quantity = summary["factory_quantity"]
         if not factory_quantity.empty:
             st.dataframe(
                 factory_quantity.reset_index().rename(columns={'数量': '供货量(吨)'}),
@@ -1371,8 +2496,7 @@ def show_statistics_tab(df):
     </div>
     """, unsafe_allow_html=True)
     
-    status_logistics = merge_logistics_with_status(filtered_logistics)
-    status_distribution = status_logistics['到货状态'].value_counts()
+    status_distribution = summary["status_distribution"]
     
     if not status_distribution.empty:
         cols = st.columns(2)
@@ -1396,34 +2520,116 @@ def show_statistics_tab(df):
         st.info("暂无状态分布数据")
 
 
-def show_data_panel(df, project):
+@st.fragment
+def show_diagnostics_tab():
+    """性能诊断面板：各处理阶段最近若干次耗时的分位数，仅总部视图可见"""
+    st.header("🩺 性能诊断")
+    metrics = get_stage_metrics()
+
+    summary = metrics.summary()
+    if summary.empty:
+        st.info("暂无耗时记录")
+    else:
+        st.dataframe(
+            summary,
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                col: st.column_config.NumberColumn(col, format="%.1f")
+                for col in ["p50(ms)", "p95(ms)", "最大(ms)", "最近(ms)"]
+            }
+        )
+
+    try:
+        st.write(f"待发送飞书通知：{get_feishu_dispatcher().pending_count()} 条")
+    except Exception as e:
+        st.warning(f"读取通知发件箱失败: {str(e)}")
+
+    st.caption(
+        f"每个阶段保留最近 {metrics.window_size} 次耗时，统计结果每 {metrics.export_interval} 秒导出到 "
+        f"{os.path.abspath(metrics.export_path)}"
+        + (f"（上次导出：{metrics.last_export_time}）" if metrics.last_export_time else "")
+    )
+
+    col1, col2 = st.columns([1, 5])
+    with col1:
+        if st.button("💾 立即导出"):
+            if metrics.export():
+                st.success("已导出耗时统计")
+            else:
+                st.error("导出耗时统计失败")
+    with col2:
+        if st.button("🧹 清空统计"):
+            metrics.reset()
+            rerun_fragment()
+
+
+def show_data_changes():
+    """显示最近一次数据更新新增、变化和移除的行数"""
+    changes = get_workbook_store().last_changes()
+    if not changes or not changes["incremental"]:
+        return
+    st.caption(
+        f"🕒 数据更新于 {changes['loaded_at'].strftime('%H:%M:%S')}："
+        f"物流明细新增或变化 {changes['logistics_changed_rows']} 行（其中新增记录 {len(changes['added_record_ids'])} 条）、"
+        f"移除 {len(changes['removed_record_ids'])} 条，发货计划新增或变化 {changes['plan_changed_rows']} 行"
+    )
+
+
+def show_load_warnings():
+    """显示数据解析时产生的提示和错误；解析可能发生在后台线程，提示只能在请求线程中展示"""
+    data_version, _, _ = load_workbook_snapshot()
+    store = get_workbook_store()
+    error = store.last_error()
+    if error and data_version is None:
+        st.error(f"数据加载失败: {error}")
+    elif error:
+        # 已有数据时解析失败不替换数据，继续使用上一版本
+        st.error(f"最新数据文件解析失败，当前显示的是上一版本数据: {error}")
+    for message in store.last_warnings():
+        st.warning(message)
+
+
+def show_data_panel(project):
     st.title(f"{project} - 发货数据")
 
     col1, col2 = st.columns([1, 5])
     with col1:
         if st.button("🔄 刷新数据"):
-            with st.spinner("刷新数据中..."):
-                st.cache_data.clear()
-                st.rerun()
+            # 指纹变化后 WorkbookStore.get 仍先返回旧数据，这里同步解析最新文件再重新运行，不等待后台线程
+            data_path = find_data_file()
+            if data_path:
+                try:
+                    with st.spinner("正在读取最新数据..."):
+                        get_workbook_store().load(data_path, get_data_file_fingerprint(data_path))
+                except Exception as e:
+                    st.error(f"数据加载失败: {str(e)}")
+                else:
+                    st.rerun()
     with col2:
         if st.button("← 返回首页"):
             st.session_state.project_selected = False
             st.rerun()
 
+    show_data_changes()
+
     if project == "中铁物贸成都分公司":
-        tab1, tab2, tab3 = st.tabs(["📋 发货计划", "🚛 物流明细", "📊 数据统计"])
+        tab1, tab2, tab3, tab4 = st.tabs(["📋 发货计划", "🚛 物流明细", "📊 数据统计", "🩺 性能诊断"])
     else:
         tab1, tab2 = st.tabs(["📋 发货计划", "🚛 物流明细"])
 
+    # 各标签页为独立片段，页内操作只重跑所在标签页
     with tab1:
-        show_plan_tab(df, project)
+        show_plan_tab(project)
         
     with tab2:
         show_logistics_tab(project)
         
     if project == "中铁物贸成都分公司":
         with tab3:
-            show_statistics_tab(df)
+            show_statistics_tab()
+        with tab4:
+            show_diagnostics_tab()
 
 
 # ==================== 主程序 ====================
@@ -1442,14 +2648,12 @@ def main():
         st.session_state.selected_project = "中铁物贸成都分公司"
 
     handle_url_parameters()
-
-    with st.spinner('加载数据中...'):
-        df = load_data()
+    show_load_warnings()
 
     if not st.session_state.project_selected:
-        show_project_selection(df)
+        show_project_selection()
     else:
-        show_data_panel(df, st.session_state.selected_project)
+        show_data_panel(st.session_state.selected_project)
 
 
 if __name__ == "__main__":
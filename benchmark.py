@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+"""数据处理性能基准：生成与真实台账列布局一致的模拟工作簿，在 Streamlit 之外计时
+
+快照、状态库和通知队列都指向临时目录，不会改动真实数据。
+
+用法：
+    python benchmark.py read --rows 20000 --extra-columns 30
+    python benchmark.py pipeline --rows 1000,10000,100000 --projects 40 --mills 12 --json result.json
+    python benchmark.py stress --processes 1,2,4 --threads 1,4 --writes 200
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import closing
+from datetime import datetime, timedelta
+
+import openpyxl
+
+import app
+
+PLAN_HEADER = [
+    "标段名称", "物资名称", "规格型号", "需求量", "已发量", "下单时间", "计划进场时间",
+    "钢厂", "单位", "联系人", "联系方式", "收货地址", "备注", "运输方式", "审核人",
+    "超期天数", "发货状态", "项目部名称"
+]
+MATERIALS = ["螺纹钢", "盘螺", "高线", "圆钢"]
+SPECS = ["HRB400E Φ12", "HRB400E Φ16", "HRB400E Φ20", "HRB400E Φ25", "HPB300 Φ8", 12, 16.0]
+# 备注为文本列，物流明细编辑器以 TextColumn 展示，不能整列为空
+REMARKS = ["正常", "加急", "分批到货", "需提前联系", "夜间卸货"]
+
+
+def generate_workbook(path, rows=5000, projects=20, mills=8, date_spread_days=60,
+                      extra_columns=0, seed=42):
+    """生成模拟工作簿：首个工作表为发货计划（第16列超期天数、第18列项目部），另有物流明细表"""
+    rng = random.Random(seed)
+    known_projects = list(app.AppConfig.PROJECT_MAPPING.values())[1:]
+    project_names = (known_projects + [f"模拟项目部{i}" for i in range(projects)])[:projects]
+    mill_names = [f"钢厂{i}" for i in range(mills)]
+    today = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def random_time():
+        return today + timedelta(days=rng.randint(-date_spread_days, date_spread_days // 4),
+                                 hours=rng.randint(0, 23))
+
+    workbook = openpyxl.Workbook(write_only=True)
+    plan_sheet = workbook.create_sheet("发货计划")
+    plan_sheet.append(PLAN_HEADER + [f"历史字段{i}" for i in range(extra_columns)])
+    for i in range(rows):
+        demand = rng.randint(1, 300)
+        plan_sheet.append([
+            f"{rng.choice(project_names)}-{rng.randint(1, 3)}标段", rng.choice(MATERIALS), rng.choice(SPECS),
+            demand, rng.randint(0, demand), random_time(), random_time(),
+            rng.choice(mill_names), "吨", "张三", 13800000000 + i, f"地址{i % 97}", rng.choice(REMARKS), "汽运", "李四",
+            max(0, rng.randint(-10, 5)), "已提报", rng.choice(project_names)
+        ] + [f"历史数据{i}-{j}" for j in range(extra_columns)])
+
+    logistics_sheet = workbook.create_sheet(app.AppConfig.LOGISTICS_SHEET_NAME)
+    logistics_sheet.append(app.AppConfig.LOGISTICS_COLUMNS + [f"历史字段{i}" for i in range(extra_columns)])
+    for i in range(rows):
+        logistics_sheet.append([
+            rng.choice(mill_names), rng.choice(MATERIALS), rng.choice(SPECS), "吨",
+            round(rng.uniform(1, 40), 3), random_time(), f"卸货点{i % 53}", "王五", 13900000000 + i,
+            rng.choice(project_names), None, rng.choice(REMARKS)
+        ] + [f"历史数据{i}-{j}" for j in range(extra_columns)])
+
+    workbook.save(path)
+    return path
+
+
+def measure(func, *args, trace_memory=True, **kwargs):
+    """返回 (结果, 耗时秒, 峰值内存MB)
+
+    tracemalloc 会让纯 Python 循环慢一个数量级以上，因此计时与内存分两次执行：
+    先不开追踪计时，再开追踪单独测峰值。trace_memory=False 时只执行一次。
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    if not trace_memory:
+        return result, elapsed, 0.0
+
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak / 1024 / 1024
+
+
+def print_row(stage, rows, elapsed, peak_mb):
+    throughput = rows / elapsed if elapsed > 0 else float("inf")
+    print(f"{stage:<28}{elapsed * 1000:>12.1f}{throughput:>14,.0f}{peak_mb:>12.1f}")
+
+
+def print_header():
+    print(f"{'阶段':<26}{'耗时(ms)':>10}{'行/秒':>12}{'峰值内存(MB)':>10}")
+
+
+def isolate_app_storage(work_dir):
+    """把快照、状态库、通知队列和耗时统计指向 work_dir，并丢弃已缓存的状态库和统计实例"""
+    app.AppConfig.SNAPSHOT_DIR = os.path.join(work_dir, ".data_cache")
+    app.AppConfig.LOGISTICS_STATUS_DB = os.path.join(work_dir, "logistics_status.db")
+    app.AppConfig.LOGISTICS_STATUS_FILE = os.path.join(work_dir, "logistics_status.csv")
+    app.AppConfig.WEBHOOK_OUTBOX_DB = os.path.join(work_dir, "feishu_outbox.db")
+    app.AppConfig.METRICS_FILE = os.path.join(work_dir, "stage_metrics.json")
+    app.get_status_store.clear()
+    app.get_stage_metrics.clear()
+
+
+def seed_statuses(record_ids, ratio, seed=42):
+    """按 ratio 为部分记录写入已保存状态，模拟现场已维护过的到货状态"""
+    rng = random.Random(seed)
+    chosen = [record_id for record_id in record_ids if rng.random() < ratio]
+    store = app.get_status_store()
+    options = app.AppConfig.STATUS_OPTIONS
+    for i, status in enumerate(options):
+        store.put_many(chosen[i::len(options)], status)
+    return len(chosen)
+
+
+def bench_read(args, workbook_path, rows):
+    """对比整表读取（pd.read_excel）与只读流式按列读取"""
+    results = []
+    for label, projected in (("整表读取 pd.read_excel", False), ("流式按列读取", True)):
+        (plan_raw, logistics_raw), elapsed, peak = measure(
+            app.read_workbook_raw, workbook_path, projected, trace_memory=not args.no_memory)
+        results.append((label, len(plan_raw) + len(logistics_raw), elapsed, peak))
+    return results
+
+
+def bench_pipeline(args, workbook_path, rows):
+    """依次计时读取、清洗、加载、状态合并、批量更新和统计汇总各阶段"""
+    trace = not args.no_memory
+    results = []
+
+    def run(stage, stage_rows, func, *func_args):
+        result, elapsed, peak = measure(func, *func_args, trace_memory=trace)
+        results.append((stage, stage_rows, elapsed, peak))
+        return result
+
+    def clear_snapshots():
+        shutil.rmtree(app.AppConfig.SNAPSHOT_DIR, ignore_errors=True)
+
+    def load_cold(previous_state=None):
+        clear_snapshots()
+        return app.load_workbook_data(workbook_path, data_version, previous_state)
+
+    plan_raw, logistics_raw = run("读取工作簿", rows * 2, app.read_workbook_raw, workbook_path)
+    run("清洗发货计划", len(plan_raw), app.clean_sheet_incremental, plan_raw, app.clean_plan_data,
+        app.AppConfig.PLAN_CATEGORY_COLUMNS, "下单时间", None)
+    run("清洗物流明细", len(logistics_raw), app.clean_sheet_incremental, logistics_raw,
+        app.clean_logistics_data, app.AppConfig.LOGISTICS_CATEGORY_COLUMNS, "交货时间", None)
+
+    data_version = app.get_data_file_fingerprint(workbook_path)
+    _, _, state = run("首次加载（无快照）", rows * 2, load_cold)
+    run("增量重载（无变化）", rows * 2, load_cold, state)
+    plan_df, logistics_df, _ = run("快照加载", rows * 2, app.load_workbook_data, workbook_path, data_version)
+
+    record_ids = logistics_df["record_id"].tolist()
+    seed_statuses(record_ids, args.status_ratio)
+    merged = run("合并到货状态", len(logistics_df), app.merge_logistics_with_status, logistics_df)
+
+    batch_ids = record_ids[:args.batch_size]
+    run(f"批量更新状态（{len(batch_ids)}条）", len(batch_ids),
+        app.batch_update_logistics_status, batch_ids, "已到货")
+    cube = run("构建统计立方体", len(merged), app.build_statistics_cube, merged)
+    run("统计汇总", len(cube), app.summarize_logistics, cube)
+    return results
+
+
+def stress_thread(store, seed, writes, record_ids, hot_ids, batch_size):
+    """单个写入线程：交替执行批量直接写入和带版本检查的读-改-写（冲突时重读重试），返回计数"""
+    rng = random.Random(seed)
+    options = app.AppConfig.STATUS_OPTIONS
+    counts = {"blind_rows": 0, "transactions": 0, "rmw_commits": 0, "conflicts": 0, "errors": 0}
+    for i in range(writes):
+        try:
+            if i % 2 == 0:
+                chosen = rng.sample(record_ids, batch_size)
+                store.put_statuses({record_id: rng.choice(options) for record_id in chosen})
+                counts["blind_rows"] += batch_size
+                counts["transactions"] += 1
+            else:
+                hot_id = rng.choice(hot_ids)
+                while True:
+                    version = store.get_versions([hot_id]).get(hot_id, 0)
+                    if not store.put_statuses({hot_id: rng.choice(options)}, {hot_id: version}):
+                        counts["rmw_commits"] += 1
+                        counts["transactions"] += 1
+                        break
+                    counts["conflicts"] += 1
+        except sqlite3.OperationalError:
+            counts["errors"] += 1
+    return counts
+
+
+def stress_process(db_path, wal, threads, writes, record_ids, hot_ids, batch_size, seed, barrier, queue):
+    """单个写入进程：threads 个线程共用一个状态库实例，所有进程就绪后同时开始，结果放入 queue"""
+    app.AppConfig.STATUS_DB_WAL = wal
+    store = app.LogisticsStatusStore(db_path)
+    results = [None] * threads
+
+    def run(index):
+        results[index] = stress_thread(store, seed * 1000 + index, writes, record_ids, hot_ids, batch_size)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    barrier.wait()
+    start = time.time()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    totals = {key: sum(result[key] for result in results) for key in results[0]}
+    queue.put((totals, start, time.time()))
+
+
+def verify_status_store(db_path, hot_ids, totals):
+    """每次写入使行版本号加一、状态库版本号加一：版本号之和与成功写入次数一致即没有丢失更新"""
+    with closing(sqlite3.connect(db_path)) as conn:
+        version_sum = conn.execute("SELECT COALESCE(SUM(version), 0) FROM logistics_status").fetchone()[0]
+        placeholders = ",".join("?" * len(hot_ids))
+        hot_sum = conn.execute(
+            f"SELECT COALESCE(SUM(version), 0) FROM logistics_status WHERE record_id IN ({placeholders})",
+            hot_ids).fetchone()[0]
+        meta_version = conn.execute("SELECT value FROM status_meta WHERE key = 'version'").fetchone()[0]
+    return (version_sum == totals["blind_rows"] + totals["rmw_commits"]
+            and hot_sum == totals["rmw_commits"]
+            and meta_version == totals["transactions"])
+
+
+def bench_stress(args):
+    """多进程 × 多线程同时写状态库，统计事务吞吐、版本冲突重试次数，并校验没有丢失更新"""
+    record_ids = [f"stress-{i:06d}" for i in range(args.records)]
+    hot_ids = [f"hot-{i}" for i in range(args.hot_records)]
+    context = multiprocessing.get_context("spawn")
+    report = []
+    print(f"{'进程':>4}{'线程':>6}{'写入者':>6}{'事务数':>8}{'事务/秒':>10}{'冲突重试':>8}{'错误':>6}  校验")
+    for processes in args.processes:
+        for threads in args.threads:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                db_path = os.path.join(tmp_dir, "logistics_status.db")
+                app.AppConfig.STATUS_DB_WAL = not args.no_wal
+                app.LogisticsStatusStore(db_path)
+                barrier = context.Barrier(processes)
+                queue = context.Queue()
+                workers = [
+                    context.Process(target=stress_process, args=(
+                        db_path, not args.no_wal, threads, args.writes, record_ids, hot_ids,
+                        args.stress_batch_size, i, barrier, queue))
+                    for i in range(processes)
+                ]
+                for worker in workers:
+                    worker.start()
+                results = [queue.get() for _ in workers]
+                for worker in workers:
+                    worker.join()
+
+                totals = {key: sum(result[0][key] for result in results) for key in results[0][0]}
+                elapsed = max(result[2] for result in results) - min(result[1] for result in results)
+                verified = verify_status_store(db_path, hot_ids, totals)
+
+            rate = totals["transactions"] / elapsed if elapsed > 0 else float("inf")
+            print(f"{processes:>6}{threads:>8}{processes * threads:>9}{totals['transactions']:>11}"
+                  f"{rate:>13,.0f}{totals['conflicts']:>12}{totals['errors']:>8}  {'通过' if verified else '失败'}")
+            report.append({"command": "stress", "processes": processes, "threads": threads,
+                           "seconds": round(elapsed, 6), "verified": verified, **totals})
+    return report
+
+
+BENCHMARKS = {"read": bench_read, "pipeline": bench_pipeline}
+
+
+def parse_int_list(value):
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="钢筋发货监控系统数据处理性能基准")
+    parser.add_argument("command", choices=sorted(BENCHMARKS) + ["stress"],
+                        help="read: 对比 Excel 读取方式；pipeline: 计时数据处理各阶段；stress: 状态库并发写入压测")
+    parser.add_argument("--rows", type=parse_int_list, default=[5000],
+                        help="每个工作表的行数，逗号分隔可依次测试多个规模，如 1000,10000,100000")
+    parser.add_argument("--projects", type=int, default=20, help="项目部数量")
+    parser.add_argument("--mills", type=int, default=8, help="钢厂数量")
+    parser.add_argument("--date-spread", type=int, default=60, help="交货/下单时间分布的天数")
+    parser.add_argument("--extra-columns", type=int, default=0, help="每个工作表额外的历史字段列数")
+    parser.add_argument("--status-ratio", type=float, default=0.3, help="已保存到货状态的记录比例")
+    parser.add_argument("--batch-size", type=int, default=500, help="批量更新状态的记录数")
+    parser.add_argument("--workbook", help="使用已有工作簿，不生成模拟数据（忽略 --rows）")
+    parser.add_argument("--no-memory", action="store_true", help="不统计峰值内存，只计时")
+    parser.add_argument("--json", help="把结果写入 JSON 文件，便于对比不同版本")
+    stress = parser.add_argument_group("stress 参数")
+    stress.add_argument("--processes", type=parse_int_list, default=[1, 2, 4], help="写入进程数，逗号分隔")
+    stress.add_argument("--threads", type=parse_int_list, default=[1, 4], help="每个进程的写入线程数，逗号分隔")
+    stress.add_argument("--writes", type=int, default=200, help="每个线程的写入次数")
+    stress.add_argument("--records", type=int, default=2000, help="直接写入涉及的记录数")
+    stress.add_argument("--hot-records", type=int, default=5, help="读-改-写争用的热点记录数")
+    stress.add_argument("--stress-batch-size", type=int, default=5, help="每次直接写入的记录数")
+    stress.add_argument("--no-wal", action="store_true", help="不启用 WAL 模式，用于对比")
+    args = parser.parse_args()
+
+    if args.command == "stress":
+        report = bench_stress(args)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            print(f"结果已写入 {args.json}")
+        return
+
+    report = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rows in ([None] if args.workbook else args.rows):
+            work_dir = tempfile.mkdtemp(dir=tmp_dir)
+            isolate_app_storage(work_dir)
+
+            workbook_path = args.workbook
+            if workbook_path:
+                rows = len(app.read_workbook_raw(workbook_path)[1])
+            else:
+                workbook_path = os.path.join(work_dir, "benchmark.xlsx")
+                _, elapsed, _ = measure(generate_workbook, workbook_path, rows, args.projects, args.mills,
+                                        args.date_spread, args.extra_columns, trace_memory=False)
+                print(f"已生成模拟工作簿：{rows} 行 × 2 表，额外 {args.extra_columns} 列，"
+                      f"{os.path.getsize(workbook_path) / 1024:.0f} KB（{elapsed:.1f}s）")
+
+            print_header()
+            for stage, stage_rows, elapsed, peak in BENCHMARKS[args.command](args, workbook_path, rows):
+                print_row(stage, stage_rows, elapsed, peak)
+                report.append({"command": args.command, "rows": rows, "stage": stage, "stage_rows": stage_rows,
+                               "seconds": round(elapsed, 6), "peak_mb": round(peak, 3)})
+            print()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""本地飞书机器人调试服务：接收 webhook 消息并打印，可模拟延迟和失败
+
+用法：
+    python feishu_stub.py --port 8765 --delay 2 --fail-rate 0.3
+    FEISHU_WEBHOOK_URL=http://127.0.0.1:8765/hook streamlit run app.py
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def make_handler(delay, fail_rate):
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            payload = self.rfile.read(length).decode("utf-8")
+            time.sleep(delay)
+
+            if random.random() < fail_rate:
+                body = {"code": 11232, "msg": "frequency limited"}
+            else:
+                body = {"code": 0, "msg": "success"}
+                try:
+                    card = json.loads(payload).get("card", {})
+                    title = card.get("header", {}).get("title", {}).get("content", "")
+                except ValueError:
+                    title = "<无效JSON>"
+                print(f"[{time.strftime('%H:%M:%S')}] 收到通知: {title}", flush=True)
+
+            data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地飞书 webhook 调试服务")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="每次响应前等待的秒数")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回限流错误的概率 (0~1)")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.delay, args.fail_rate))
+    print(f"飞书调试服务已启动: http://127.0.0.1:{args.port}/hook", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()